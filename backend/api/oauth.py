@@ -50,10 +50,14 @@ class OAuthStateStore:
     """Persistent OAuth state storage using Redis"""
     
     def __init__(self):
-        from utilities.redis_manager import redis_manager
-        self.redis = redis_manager
         self._init_encryption()
     
+    @property
+    def redis(self):
+        """Shared Redis manager, connected on first use rather than at import"""
+        from utilities.redis_manager import get_redis
+        return get_redis()
+    
     def _init_encryption(self):
         """Initialize encryption cipher for state payloads"""
         encryption_key = os.getenv('OAUTH_ENCRYPTION_KEY')
@@ -255,6 +259,17 @@ def set_auth_cookie(response: Response, access_token: str):
         max_age=30 * 60  # 30 minutes (same as token expiry)
     )
 
+def login_json_response(user_login_response: UserLoginResponse, response: Response) -> Response:
+    """Render a login response with pydantic-core's JSON serializer.
+    
+    Returning a Response skips FastAPI's response_model re-validation and json.dumps pass;
+    the cookies and headers set on the injected response are carried over, as FastAPI
+    would do for a response it builds itself.
+    """
+    json_response = Response(content=user_login_response.model_dump_json(), media_type="application/json")
+    json_response.headers.raw.extend(response.headers.raw)
+    return json_response
+
 async def periodic_cleanup():
     """Periodic cleanup task that runs every 5 minutes"""
     while True:
@@ -607,7 +622,7 @@ async def select_role_for_oauth(
     # Clean up state
     oauth_state_store.delete_state(role_data.state)
     
-    return create_user_login_response(new_user)
+    return login_json_response(create_user_login_response(new_user), response)
 
 @router.post("/google/link", response_model=UserLoginResponse)
 async def link_google_account(
@@ -663,7 +678,7 @@ async def link_google_account(
         set_auth_cookie(response, access_token)
         
         oauth_state_store.delete_state(request.state)  # Clean up state
-        return create_user_login_response(linked_user)
+        return login_json_response(create_user_login_response(linked_user), response)
     
     elif request.action == "create_separate":
         # Create separate account with Google OAuth using selected role
@@ -674,7 +689,7 @@ async def link_google_account(
         set_auth_cookie(response, access_token)
         
         oauth_state_store.delete_state(request.state)  # Clean up state
-        return create_user_login_response(new_user)
+        return login_json_response(create_user_login_response(new_user), response)
     
     else:
         raise HTTPException(
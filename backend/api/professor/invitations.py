@@ -15,7 +15,7 @@ from database.schemas import (
     UserResponse
 )
 from middleware.role_auth import require_professor
-from utilities.id_generator import generate_invitation_token
+from utilities.id_generator import generate_invitation_tokens
 from services.email_service import email_service
 from services.notification_service import notification_service
 
@@ -59,6 +59,8 @@ async def invite_students_to_cohort(
     
     created_invitations = []
     base_url = str(request.base_url).rstrip('/')
+    # One random read for the whole batch; skipped invitations just leave tokens unused
+    invitation_tokens = iter(generate_invitation_tokens(len(invitations)))
     
     for invitation_data in invitations:
         try:
@@ -98,7 +100,7 @@ async def invite_students_to_cohort(
                 professor_id=current_user.id,
                 student_email=invitation_data.email,
                 student_id=existing_student.id if existing_student else None,
-                invitation_token=generate_invitation_token(),
+                invitation_token=next(invitation_tokens),
                 message=invitation_data.message,
                 expires_at=datetime.utcnow() + timedelta(days=7)  # 7 days expiry
             )
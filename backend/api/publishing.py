@@ -1224,6 +1224,7 @@ async def cleanup_archives(
 
 @router.get("/cleanup/stats")
 async def get_cleanup_stats(
+    exact: bool = Query(False, description="Scan for exact counts instead of planner estimates"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -1233,7 +1234,7 @@ async def get_cleanup_stats(
     from services.soft_deletion import SoftDeletionService
     
     service = SoftDeletionService(db)
-    stats = service.get_archive_stats()
+    stats = service.get_archive_stats(exact=exact)
     
     return {
         "status": "success",
@@ -27,7 +27,6 @@ def main():
         print("❌ Failed to get database connection")
         return 1
     service = SoftDeletionService(db)
-    service = SoftDeletionService(db)
     
     try:
         # Get current archive stats
@@ -1,3 +1,4 @@
+from contextlib import contextmanager
 from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -67,6 +68,7 @@ if settings.database_url.startswith("postgresql"):
         pool_recycle=300,    # Recycle connections every 5 minutes
         pool_size=5,         # Number of connections to maintain
         max_overflow=10,     # Maximum connections beyond pool_size
+        insertmanyvalues_page_size=500,  # Rows per batched INSERT round-trip in executemany
         connect_args={
             "connect_timeout": 30,  # Connection timeout
             "application_name": "AOM_2025_Backend"
@@ -93,4 +95,25 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close() 
+
+def warm_pool(connections: int = 1):
+    """Open pooled connections ahead of the first requests so they skip the connect handshake"""
+    opened = []
+    try:
+        # Hold the connections at once so the pool keeps that many, not one reused connection
+        for _ in range(connections):
+            opened.append(engine.connect())
+    finally:
+        for conn in opened:
+            conn.close()
+
+@contextmanager
+def scoped_session():
+    """Database session for use outside request dependencies: `with scoped_session() as db:`"""
+    gen = get_db()
+    db = next(gen)
+    try:
+        yield db
+    finally:
+        next(gen, None)
@@ -0,0 +1,19 @@
+"""
+In-process Alembic migrations
+Runs `alembic upgrade head` through Alembic's command API instead of spawning a subprocess
+"""
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+
+DATABASE_DIR = Path(__file__).parent
+
+def upgrade_to_head() -> None:
+    """Upgrade the database to the latest Alembic revision"""
+    config = Config(str(DATABASE_DIR / "alembic.ini"))
+    # Resolve the scripts independently of the caller's working directory
+    config.set_main_option("script_location", str(DATABASE_DIR / "migrations"))
+    # Keep the host application's logging configuration intact
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, "head")
@@ -0,0 +1,82 @@
+"""vector_embeddings_unit_normalize
+
+Revision ID: a9d3f5c7e1b2
+Revises: f1b6d8e2c4a9
+Create Date: 2026-10-17 09:26:41.305817
+
+"""
+import json
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d3f5c7e1b2'
+down_revision = 'f1b6d8e2c4a9'
+branch_labels = None
+depends_on = None
+
+# Rows read and rewritten per round trip
+BATCH_ROWS = 500
+
+
+def upgrade() -> None:
+    # Rows without int8 codes predate unit normalization; the search paths score by inner
+    # product, so scale them to unit length and quantize them like newly stored rows
+    bind = op.get_bind()
+    udt_name = bind.execute(sa.text(
+        "SELECT udt_name FROM information_schema.columns "
+        "WHERE table_name = 'vector_embeddings' AND column_name = 'embedding_vector'"
+    )).scalar()
+    vector_cast = "vector" if udt_name == "vector" else "json"
+
+    update = sa.text(
+        "UPDATE vector_embeddings "
+        f"SET embedding_vector = CAST(:vector AS {vector_cast}), "
+        "embedding_int8 = :codes, embedding_scale = :scale "
+        "WHERE id = :id"
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            "SELECT id, embedding_vector::text FROM vector_embeddings "
+            "WHERE embedding_int8 IS NULL AND id > :last_id ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": BATCH_ROWS}).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        params = []
+        for row_id, raw_vector in rows:
+            try:
+                stored = json.loads(raw_vector)
+                # Some early fallback rows hold a JSON-encoded string of {"embedding": [...]}
+                if isinstance(stored, str):
+                    stored = json.loads(stored).get("embedding")
+                vector = np.asarray(stored, dtype=np.float32)
+            except (TypeError, ValueError, AttributeError):
+                continue
+            if vector.ndim != 1 or not vector.size:
+                continue
+
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector = vector / norm
+            peak = float(np.abs(vector).max())
+            scale = peak / 127.0 if peak > 0 else 1.0
+            codes = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+            params.append({
+                "id": row_id,
+                "vector": json.dumps(vector.tolist(), separators=(",", ":")),
+                "codes": codes.tobytes(),
+                "scale": scale
+            })
+        if params:
+            bind.execute(update, params)
+
+
+def downgrade() -> None:
+    # Normalization is lossy (original magnitudes are gone) and harmless to keep
+    pass
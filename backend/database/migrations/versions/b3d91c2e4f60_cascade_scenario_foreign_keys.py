@@ -0,0 +1,53 @@
+"""cascade_scenario_foreign_keys
+
+Revision ID: b3d91c2e4f60
+Revises: 7fcfe7937fd1
+Create Date: 2026-10-16 10:12:44.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d91c2e4f60'
+down_revision = '7fcfe7937fd1'
+branch_labels = None
+depends_on = None
+
+
+# (table, column, referred table, ondelete) for every FK a scenario hard delete cascades through.
+# Constraint names follow PostgreSQL's default <table>_<column>_fkey from the initial schema.
+CASCADE_FOREIGN_KEYS = [
+    ('scene_personas', 'scene_id', 'scenario_scenes', 'CASCADE'),
+    ('scene_personas', 'persona_id', 'scenario_personas', 'CASCADE'),
+    ('conversation_logs', 'scene_id', 'scenario_scenes', 'CASCADE'),
+    ('conversation_logs', 'user_progress_id', 'user_progress', 'CASCADE'),
+    ('scene_progress', 'scene_id', 'scenario_scenes', 'CASCADE'),
+    ('scene_progress', 'user_progress_id', 'user_progress', 'CASCADE'),
+    ('session_memory', 'scene_id', 'scenario_scenes', 'CASCADE'),
+    ('session_memory', 'user_progress_id', 'user_progress', 'CASCADE'),
+    ('conversation_summaries', 'scene_id', 'scenario_scenes', 'CASCADE'),
+    ('conversation_summaries', 'user_progress_id', 'user_progress', 'CASCADE'),
+    ('agent_sessions', 'user_progress_id', 'user_progress', 'CASCADE'),
+    ('user_progress', 'scenario_id', 'scenarios', 'CASCADE'),
+    ('user_progress', 'current_scene_id', 'scenario_scenes', 'SET NULL'),
+    ('scenario_personas', 'scenario_id', 'scenarios', 'CASCADE'),
+    ('scenario_scenes', 'scenario_id', 'scenarios', 'CASCADE'),
+    ('scenario_files', 'scenario_id', 'scenarios', 'CASCADE'),
+    ('scenario_reviews', 'scenario_id', 'scenarios', 'CASCADE'),
+]
+
+
+def upgrade() -> None:
+    for table, column, referred_table, ondelete in CASCADE_FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred_table, [column], ['id'], ondelete=ondelete)
+
+
+def downgrade() -> None:
+    for table, column, referred_table, _ in reversed(CASCADE_FOREIGN_KEYS):
+        name = f'{table}_{column}_fkey'
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred_table, [column], ['id'])
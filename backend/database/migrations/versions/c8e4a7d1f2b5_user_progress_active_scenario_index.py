@@ -0,0 +1,30 @@
+"""user_progress_active_scenario_index
+
+Revision ID: c8e4a7d1f2b5
+Revises: b3d91c2e4f60
+Create Date: 2026-10-16 11:03:27.904116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e4a7d1f2b5'
+down_revision = 'b3d91c2e4f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside a transaction; build without blocking writes
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_progress_scenario_active "
+            "ON user_progress (scenario_id) WHERE archived_at IS NULL"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_user_progress_scenario_active")
@@ -0,0 +1,36 @@
+"""vector_embeddings_hash_type_unique
+
+Revision ID: d5f2b8c3a9e7
+Revises: c8e4a7d1f2b5
+Create Date: 2026-10-16 19:12:44.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f2b8c3a9e7'
+down_revision = 'c8e4a7d1f2b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Keep only the newest row per (content_hash, content_type) so the constraint can be built
+    op.execute(
+        "DELETE FROM vector_embeddings v "
+        "USING vector_embeddings newer "
+        "WHERE v.content_hash = newer.content_hash "
+        "AND v.content_type = newer.content_type "
+        "AND v.id < newer.id"
+    )
+    op.create_unique_constraint(
+        'uq_vector_embeddings_hash_type',
+        'vector_embeddings',
+        ['content_hash', 'content_type']
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_vector_embeddings_hash_type', 'vector_embeddings', type_='unique')
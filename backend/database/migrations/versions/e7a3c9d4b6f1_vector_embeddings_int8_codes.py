@@ -0,0 +1,27 @@
+"""vector_embeddings_int8_codes
+
+Revision ID: e7a3c9d4b6f1
+Revises: d5f2b8c3a9e7
+Create Date: 2026-10-16 19:48:05.231977
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3c9d4b6f1'
+down_revision = 'd5f2b8c3a9e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Nullable: rows written before quantization are quantized when the fallback search loads them
+    op.add_column('vector_embeddings', sa.Column('embedding_int8', sa.LargeBinary(), nullable=True))
+    op.add_column('vector_embeddings', sa.Column('embedding_scale', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('vector_embeddings', 'embedding_scale')
+    op.drop_column('vector_embeddings', 'embedding_int8')
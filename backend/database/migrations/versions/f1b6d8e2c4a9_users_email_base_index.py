@@ -0,0 +1,30 @@
+"""users_email_base_index
+
+Revision ID: f1b6d8e2c4a9
+Revises: e7a3c9d4b6f1
+Create Date: 2026-10-16 21:14:52.618340
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b6d8e2c4a9'
+down_revision = 'e7a3c9d4b6f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Must stay identical to database.models.email_base_expression for the planner to use it
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_email_base "
+            "ON users (regexp_replace(email, '\\+google[0-9]+@', '@'), provider)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_users_email_base")
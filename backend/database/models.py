@@ -1,7 +1,7 @@
 # AI Agent Education Platform - Database Models
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean, JSON, Table, Float, Index, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean, JSON, Table, Float, Index, UniqueConstraint, LargeBinary
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, literal_column
 from database.connection import Base, settings
 import secrets
 import string
@@ -22,6 +22,13 @@ def get_vector_column_type(dimension: int = 1536):
     else:
         return JSON
 
+def email_base_expression(email_column):
+    """Email with an OAuth '+googleN' alias suffix removed; matches idx_users_email_base.
+    
+    The pattern is inlined as SQL literals so queries compile to the exact indexed expression.
+    """
+    return func.regexp_replace(email_column, literal_column(r"'\+google[0-9]+@'"), literal_column("'@'"))
+
 def generate_cohort_id():
     """Generate a short, user-friendly cohort ID like CH-MAN8P1QS"""
     # Use uppercase letters and numbers for readability
@@ -34,8 +41,8 @@ def generate_cohort_id():
 scene_personas = Table(
     'scene_personas',
     Base.metadata,
-    Column('scene_id', Integer, ForeignKey('scenario_scenes.id'), primary_key=True),
-    Column('persona_id', Integer, ForeignKey('scenario_personas.id'), primary_key=True),
+    Column('scene_id', Integer, ForeignKey('scenario_scenes.id', ondelete="CASCADE"), primary_key=True),
+    Column('persona_id', Integer, ForeignKey('scenario_personas.id', ondelete="CASCADE"), primary_key=True),
     Column('involvement_level', String, default='participant'),  # key, participant, mentioned
     Column('created_at', DateTime(timezone=True), server_default=func.now())
 )
@@ -92,7 +99,12 @@ class User(Base):
         Index('idx_users_created_at', 'created_at'),
         Index('idx_users_google_id', 'google_id'),
         Index('idx_users_provider', 'provider'),
+        # Expression index for find_oauth_user_by_original_email; regexp_replace is PostgreSQL-only
+        Index('idx_users_email_base', email_base_expression(email), provider).ddl_if(dialect='postgresql'),
     )
+    # Fetch server defaults (created_at, updated_at) in the INSERT/UPDATE itself, via
+    # RETURNING where supported, instead of lazily re-selecting them afterwards
+    __mapper_args__ = {"eager_defaults": True}
 
 class Scenario(Base):
     __tablename__ = "scenarios"
@@ -173,11 +185,12 @@ class Scenario(Base):
     # Relationships
     creator = relationship("User", back_populates="scenarios", foreign_keys=[created_by])
     deleted_by_user = relationship("User", foreign_keys=[deleted_by])
-    personas = relationship("ScenarioPersona", back_populates="scenario", cascade="all, delete-orphan")
-    scenes = relationship("ScenarioScene", back_populates="scenario", cascade="all, delete-orphan")
-    files = relationship("ScenarioFile", back_populates="scenario", cascade="all, delete-orphan")
-    reviews = relationship("ScenarioReview", back_populates="scenario", cascade="all, delete-orphan")
-    user_progress = relationship("UserProgress", back_populates="scenario")
+    # Child rows are removed by ON DELETE CASCADE; passive_deletes skips loading them first
+    personas = relationship("ScenarioPersona", back_populates="scenario", cascade="all, delete-orphan", passive_deletes=True)
+    scenes = relationship("ScenarioScene", back_populates="scenario", cascade="all, delete-orphan", passive_deletes=True)
+    files = relationship("ScenarioFile", back_populates="scenario", cascade="all, delete-orphan", passive_deletes=True)
+    reviews = relationship("ScenarioReview", back_populates="scenario", cascade="all, delete-orphan", passive_deletes=True)
+    user_progress = relationship("UserProgress", back_populates="scenario", passive_deletes=True)
     
     # PostgreSQL indexes for better performance
     __table_args__ = (
@@ -193,7 +206,7 @@ class ScenarioPersona(Base):
     __tablename__ = "scenario_personas"
     
     id = Column(Integer, primary_key=True, index=True)
-    scenario_id = Column(Integer, ForeignKey("scenarios.id"), nullable=False)
+    scenario_id = Column(Integer, ForeignKey("scenarios.id", ondelete="CASCADE"), nullable=False)
     
     # Persona details from AI processing
     name = Column(String, nullable=False, index=True)
@@ -218,7 +231,7 @@ class ScenarioScene(Base):
     __tablename__ = "scenario_scenes"
     
     id = Column(Integer, primary_key=True, index=True)
-    scenario_id = Column(Integer, ForeignKey("scenarios.id"), nullable=False)
+    scenario_id = Column(Integer, ForeignKey("scenarios.id", ondelete="CASCADE"), nullable=False)
     
     # Scene details from AI processing
     title = Column(String, nullable=False)
@@ -257,7 +270,7 @@ class ScenarioFile(Base):
     __tablename__ = "scenario_files"
     
     id = Column(Integer, primary_key=True, index=True)
-    scenario_id = Column(Integer, ForeignKey("scenarios.id"), nullable=False)
+    scenario_id = Column(Integer, ForeignKey("scenarios.id", ondelete="CASCADE"), nullable=False)
     
     filename = Column(String, nullable=False)  # Add missing filename field
     file_path = Column(String, nullable=True)  # Make nullable since we have filename
@@ -279,7 +292,7 @@ class ScenarioReview(Base):
     __tablename__ = "scenario_reviews"
     
     id = Column(Integer, primary_key=True, index=True)
-    scenario_id = Column(Integer, ForeignKey("scenarios.id"))
+    scenario_id = Column(Integer, ForeignKey("scenarios.id", ondelete="CASCADE"))
     reviewer_id = Column(Integer, ForeignKey("users.id"))
     
     rating = Column(Integer)  # 1-5 stars
@@ -305,10 +318,10 @@ class UserProgress(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Allow None for now
-    scenario_id = Column(Integer, ForeignKey("scenarios.id"), nullable=False)
+    scenario_id = Column(Integer, ForeignKey("scenarios.id", ondelete="CASCADE"), nullable=False)
     
     # Current simulation state
-    current_scene_id = Column(Integer, ForeignKey("scenario_scenes.id"), nullable=True)
+    current_scene_id = Column(Integer, ForeignKey("scenario_scenes.id", ondelete="SET NULL"), nullable=True)
     simulation_status = Column(String, default="not_started")  # not_started, in_progress, completed, abandoned
     
     # Progress tracking
@@ -343,13 +356,18 @@ class UserProgress(Base):
     current_scene = relationship("ScenarioScene", foreign_keys=[current_scene_id])
     scene_progress = relationship("SceneProgress", back_populates="user_progress")
     conversation_logs = relationship("ConversationLog", back_populates="user_progress")
+    
+    # Archive/soft-delete paths filter on scenario_id among non-archived rows
+    __table_args__ = (
+        Index('ix_user_progress_scenario_active', 'scenario_id', postgresql_where=archived_at.is_(None)),
+    )
 
 class SceneProgress(Base):
     __tablename__ = "scene_progress"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_progress_id = Column(Integer, ForeignKey("user_progress.id"), nullable=False)
-    scene_id = Column(Integer, ForeignKey("scenario_scenes.id"), nullable=False)
+    user_progress_id = Column(Integer, ForeignKey("user_progress.id", ondelete="CASCADE"), nullable=False)
+    scene_id = Column(Integer, ForeignKey("scenario_scenes.id", ondelete="CASCADE"), nullable=False)
     
     # Progress tracking
     status = Column(String, default="not_started")  # not_started, in_progress, completed, failed
@@ -380,8 +398,8 @@ class ConversationLog(Base):
     __tablename__ = "conversation_logs"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_progress_id = Column(Integer, ForeignKey("user_progress.id"), nullable=False)
-    scene_id = Column(Integer, ForeignKey("scenario_scenes.id"), nullable=False)
+    user_progress_id = Column(Integer, ForeignKey("user_progress.id", ondelete="CASCADE"), nullable=False)
+    scene_id = Column(Integer, ForeignKey("scenario_scenes.id", ondelete="CASCADE"), nullable=False)
     
     # Message details
     message_type = Column(String, nullable=False)  # user, ai_persona, system, hint
@@ -432,6 +450,9 @@ class VectorEmbeddings(Base):
     )
     embedding_model = Column(String, nullable=False)  # 'openai-ada-002', 'sentence-transformers', etc.
     embedding_dimension = Column(Integer, nullable=False)  # Dimension of the vector
+    # Symmetric int8 quantization of the unit-normalized vector: vector ~= int8 codes * scale
+    embedding_int8 = Column(LargeBinary, nullable=True)
+    embedding_scale = Column(Float, nullable=True)
     original_content = Column(Text, nullable=False)  # Original text content
     content_metadata = Column(JSON, nullable=True)  # Additional metadata
     similarity_threshold = Column(Float, nullable=True)  # Threshold for similarity matching
@@ -447,6 +468,8 @@ class VectorEmbeddings(Base):
         Index('idx_vector_embeddings_content_hash', 'content_hash'),
         Index('idx_vector_embeddings_active', 'is_active'),
         Index('idx_vector_embeddings_created_at', 'created_at'),
+        # Conflict target for batched upserts
+        UniqueConstraint('content_hash', 'content_type', name='uq_vector_embeddings_hash_type'),
     )
 
 
@@ -456,8 +479,8 @@ class SessionMemory(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String, nullable=False, index=True)
-    user_progress_id = Column(Integer, ForeignKey("user_progress.id"), nullable=False, index=True)
-    scene_id = Column(Integer, ForeignKey("scenario_scenes.id"), nullable=True, index=True)
+    user_progress_id = Column(Integer, ForeignKey("user_progress.id", ondelete="CASCADE"), nullable=False, index=True)
+    scene_id = Column(Integer, ForeignKey("scenario_scenes.id", ondelete="CASCADE"), nullable=True, index=True)
     memory_type = Column(String, nullable=False, index=True)  # 'conversation', 'context', 'summary', 'insight'
     memory_content = Column(Text, nullable=False)  # The actual memory content
     memory_metadata = Column(JSON, nullable=True)  # Additional metadata
@@ -492,8 +515,8 @@ class ConversationSummaries(Base):
     __tablename__ = "conversation_summaries"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_progress_id = Column(Integer, ForeignKey("user_progress.id"), nullable=False, index=True)
-    scene_id = Column(Integer, ForeignKey("scenario_scenes.id"), nullable=True, index=True)
+    user_progress_id = Column(Integer, ForeignKey("user_progress.id", ondelete="CASCADE"), nullable=False, index=True)
+    scene_id = Column(Integer, ForeignKey("scenario_scenes.id", ondelete="CASCADE"), nullable=True, index=True)
     summary_type = Column(String, nullable=False, index=True)  # 'scene_completion', 'conversation', 'learning_moment'
     summary_text = Column(Text, nullable=False)  # The summary content
     key_points = Column(JSON, nullable=True)  # Extracted key points
@@ -529,7 +552,7 @@ class AgentSessions(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String, nullable=False, unique=True, index=True)
-    user_progress_id = Column(Integer, ForeignKey("user_progress.id"), nullable=False, index=True)
+    user_progress_id = Column(Integer, ForeignKey("user_progress.id", ondelete="CASCADE"), nullable=False, index=True)
     agent_type = Column(String, nullable=False, index=True)  # 'persona', 'grading', 'summarization', 'retrieval'
     agent_id = Column(String, nullable=True, index=True)  # Specific agent identifier
     session_state = Column(JSON, nullable=True)  # Current session state
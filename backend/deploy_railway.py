@@ -79,15 +79,31 @@ def check_environment():
     
     return True
 
-def test_database_connection():
+def check_database():
+    """Run the database checks on a single connection and return their results"""
+    results = {"connection": False, "pgvector": False}
+    try:
+        from database.connection import engine
+        
+        # One connection for every check: one TCP/TLS/auth handshake instead of one per check.
+        # AUTOCOMMIT skips the BEGIN/COMMIT round trips around each probe, and a failed
+        # CREATE EXTENSION cannot leave the connection in an aborted transaction.
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            results["connection"] = test_database_connection(conn)
+            if results["connection"]:
+                results["pgvector"] = setup_pgvector_extension(conn)
+    except Exception as e:
+        print(f"❌ Database connection failed: {e}")
+    return results
+
+def test_database_connection(conn):
     """Test database connection"""
     print("🔍 Testing database connection...")
     try:
-        from database.connection import engine
-        with engine.connect() as conn:
-            result = conn.execute("SELECT 1")
-            print("✅ Database connection successful")
-            return True
+        from sqlalchemy import text
+        conn.execute(text("SELECT 1"))
+        print("✅ Database connection successful")
+        return True
     except Exception as e:
         print(f"❌ Database connection failed: {e}")
         return False
@@ -97,52 +113,43 @@ def run_migrations():
     print("🗄️  Running database migrations...")
     
     try:
-        # Change to database directory where alembic.ini is located
-        db_dir = backend_dir / "database"
+        from database.migrate import upgrade_to_head
         
-        # Run alembic upgrade
-        result = run_command("alembic upgrade head", cwd=db_dir)
+        # Run alembic upgrade in-process rather than through a shell
+        upgrade_to_head()
+        print("✅ Database migrations completed successfully")
+        return True
         
-        if result.returncode == 0:
-            print("✅ Database migrations completed successfully")
-            return True
-        else:
-            print("❌ Database migrations failed")
-            return False
-            
     except Exception as e:
         print(f"❌ Migration error: {e}")
         return False
 
-def setup_pgvector_extension():
+def setup_pgvector_extension(conn):
     """Set up pgvector extension if needed"""
     print("🔧 Setting up pgvector extension...")
     
     try:
-        from database.connection import engine
         from sqlalchemy import text
         
-        with engine.connect() as conn:
-            # Check if extension exists
-            result = conn.execute(text(
-                "SELECT 1 FROM pg_extension WHERE extname = 'vector'"
-            ))
-            
-            if result.fetchone():
-                print("✅ pgvector extension already exists")
+        # Check if extension exists
+        result = conn.execute(text(
+            "SELECT 1 FROM pg_extension WHERE extname = 'vector'"
+        ))
+        
+        if result.fetchone():
+            print("✅ pgvector extension already exists")
+            return True
+        else:
+            print("⚠️  pgvector extension not found")
+            try:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+                print("✅ pgvector extension created successfully")
                 return True
-            else:
-                print("⚠️  pgvector extension not found")
-                try:
-                    conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
-                    conn.commit()
-                    print("✅ pgvector extension created successfully")
-                    return True
-                except Exception as e:
-                    print(f"⚠️  Could not create pgvector extension: {e}")
-                    print("💡 This is okay - vector search will be disabled")
-                    return True  # Don't fail deployment for this
-                    
+            except Exception as e:
+                print(f"⚠️  Could not create pgvector extension: {e}")
+                print("💡 This is okay - vector search will be disabled")
+                return True  # Don't fail deployment for this
+                
     except Exception as e:
         print(f"⚠️  Could not check pgvector extension: {e}")
         print("💡 This is okay - vector search will be disabled")
@@ -179,14 +186,11 @@ def main():
         print("❌ Environment check failed. Please set missing variables.")
         sys.exit(1)
     
-    # Step 2: Test database connection
-    if not test_database_connection():
+    # Steps 2-3: Test database connection and set up pgvector extension
+    if not check_database()["connection"]:
         print("❌ Database connection failed. Check your DATABASE_URL.")
         sys.exit(1)
     
-    # Step 3: Set up pgvector extension
-    setup_pgvector_extension()
-    
     # Step 4: Run migrations
     if not run_migrations():
         print("❌ Database migrations failed.")
@@ -17,10 +17,15 @@ import os
 # Load environment variables from .env file
 load_dotenv()
 
+# Log through a queue so handler I/O stays off request threads; this must run
+# before the imports below, which log at import time
+from utilities.secure_logging import configure_logging
+configure_logging()
+
 # Logger for main application
 logger = logging.getLogger(__name__)
 
-from database.connection import get_db, engine, settings, _validate_environment
+from database.connection import get_db, engine, settings, _validate_environment, warm_pool
 from database.models import Base, User, Scenario, ScenarioPersona, ScenarioScene, ScenarioFile, ScenarioReview, scene_personas
 from database.schemas import (
     ScenarioCreate, UserRegister, UserLogin, UserLoginResponse, 
@@ -28,7 +33,7 @@ from database.schemas import (
 )
 from utilities.auth import (
     get_password_hash, authenticate_user, create_access_token, 
-    get_current_user, get_current_user_optional, require_admin
+    get_current_user, get_current_user_optional, require_admin, invalidate_cached_user
 )
 from utilities.debug_logging import debug_log
 from utilities.rate_limiter import check_test_login_rate_limit
@@ -54,20 +59,20 @@ from services.session_manager import session_manager_lifespan
 from services.session_manager import session_manager
 
 # Import Redis services
-from utilities.redis_manager import redis_manager, redis_cleanup_task
+from utilities.redis_manager import get_redis
 from services.ai_cache_service import ai_cache_service
 from services.db_cache_service import db_cache_service
 
 # Combined lifespan manager for all background tasks
 @asynccontextmanager
 async def combined_lifespan(app):
-    """Combined lifespan manager for OAuth, session, and Redis cleanup tasks"""
+    """Combined lifespan manager for OAuth and session cleanup tasks"""
     # Validate environment on startup
     _validate_environment()
     
     # Test Redis connection on startup
     try:
-        if not redis_manager.is_available():
+        if not get_redis().is_available():
             raise RuntimeError("Redis is not available. Please check your Redis configuration.")
         logger.info("Redis connection verified successfully")
     except Exception as e:
@@ -78,16 +83,7 @@ async def combined_lifespan(app):
     async with oauth_lifespan(app):
         # Start session manager cleanup task
         async with session_manager_lifespan(app):
-            # Start Redis cleanup task
-            redis_task = asyncio.create_task(redis_cleanup_task())
-            try:
-                yield
-            finally:
-                redis_task.cancel()
-                try:
-                    await redis_task
-                except asyncio.CancelledError:
-                    pass
+            yield
 
 # Create FastAPI app
 app = FastAPI(
@@ -105,40 +101,37 @@ async def health_check():
 @app.on_event("startup")
 async def startup_event():
     """Run startup checks when the application starts"""
-    import logging
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-    
     logger.info("🚀 Starting AI Agent Education Platform...")
     
     # Run database migrations in production
     if settings.environment == "production":
         try:
             logger.info("🗄️  Running database migrations...")
-            import subprocess
-            import sys
-            from pathlib import Path
-            
-            # Change to database directory and run migrations
-            db_dir = Path(__file__).parent / "database"
-            result = subprocess.run(
-                [sys.executable, "-m", "alembic", "upgrade", "head"],
-                cwd=db_dir,
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
+            from database.migrate import upgrade_to_head
             
-            if result.returncode == 0:
-                logger.info("✅ Database migrations completed successfully")
-            else:
-                logger.warning(f"⚠️  Migration warning: {result.stderr}")
-                logger.info("💡 App will continue - migrations may have been already applied")
+            # Run in-process on a worker thread instead of spawning an alembic subprocess.
+            # A thread cannot be killed, so wait for it to finish rather than time out and
+            # serve requests while it still holds its locks; data migrations can be slow
+            migration = asyncio.ensure_future(asyncio.to_thread(upgrade_to_head))
+            while True:
+                done, _ = await asyncio.wait({migration}, timeout=60)
+                if done:
+                    break
+                logger.warning("⏳ Database migrations still running; startup is waiting for them")
+            migration.result()
+            logger.info("✅ Database migrations completed successfully")
                 
         except Exception as e:
             logger.warning(f"⚠️  Migration error: {e}")
             logger.info("💡 App will continue - database may already be up to date")
     
+    # Prime the connection pool so the first requests reuse live connections
+    try:
+        warm_pool(engine.pool.size() if hasattr(engine.pool, "size") else 1)
+        logger.info("✅ Database connection pool warmed")
+    except Exception as e:
+        logger.warning(f"⚠️  Could not warm database connection pool: {e}")
+    
     logger.info("✅ Application startup completed successfully!")
     
 
@@ -878,6 +871,7 @@ async def update_current_user(
     current_user.updated_at = datetime.utcnow()
     
     db.commit()
+    invalidate_cached_user(current_user.id)
     db.refresh(current_user)
     
     return current_user
@@ -898,6 +892,7 @@ async def change_password(
     current_user.updated_at = datetime.utcnow()
     
     db.commit()
+    invalidate_cached_user(current_user.id)
     
     return {"message": "Password changed successfully"}
 
@@ -1052,8 +1047,8 @@ async def get_cache_stats(current_user: User = Depends(require_admin)):
         ai_stats = ai_cache_service.get_cache_stats()
         db_stats = db_cache_service.get_cache_stats()
         redis_info = {
-            "redis_available": redis_manager.is_available(),
-            "total_keys": len(redis_manager.get_keys("*"))
+            "redis_available": get_redis().is_available(),
+            "total_keys": get_redis().count_keys()
         }
         
         return {
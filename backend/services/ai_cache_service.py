@@ -8,7 +8,8 @@ import json
 import logging
 from typing import Any, Dict, Optional, Union, List
 from datetime import datetime, timedelta
-from utilities.redis_manager import redis_manager, cache_manager
+# Getters, not the instances: importing this module must not connect to Redis
+from utilities.redis_manager import get_redis, get_cache
 
 # Logger for AI cache operations
 logger = logging.getLogger(__name__)
@@ -77,7 +78,7 @@ class AICacheService:
             else:
                 ttl = self.default_ttl
         
-        success = redis_manager.set(cache_key, cache_data, ttl)
+        success = get_redis().set(cache_key, cache_data, ttl)
         if success:
             logger.debug(f"Cached OpenAI response for operation: {operation}")
         
@@ -91,7 +92,7 @@ class AICacheService:
         """Get cached OpenAI API response"""
         
         cache_key = self._generate_cache_key(operation, input_data, model, temperature)
-        cached_data = redis_manager.get(cache_key)
+        cached_data = get_redis().get(cache_key)
         
         if cached_data:
             logger.debug(f"Cache hit for OpenAI operation: {operation}")
@@ -116,7 +117,7 @@ class AICacheService:
         }
         
         # Embeddings are relatively stable, cache for 24 hours
-        success = redis_manager.set(cache_key, cache_data, self.expensive_operations_ttl)
+        success = get_redis().set(cache_key, cache_data, self.expensive_operations_ttl)
         if success:
             logger.debug(f"Cached embedding for text length: {len(text)}")
         
@@ -126,7 +127,7 @@ class AICacheService:
         """Get cached text embedding"""
         
         cache_key = self._generate_cache_key("embedding", text, model)
-        cached_data = redis_manager.get(cache_key)
+        cached_data = get_redis().get(cache_key)
         
         if cached_data:
             logger.debug(f"Cache hit for embedding, text length: {len(text)}")
@@ -149,7 +150,7 @@ class AICacheService:
         }
         
         # Scenario analysis is expensive, cache for 7 days
-        success = redis_manager.set(cache_key, cache_data, 7 * 24 * 3600)
+        success = get_redis().set(cache_key, cache_data, 7 * 24 * 3600)
         if success:
             logger.debug("Cached scenario analysis result")
         
@@ -159,7 +160,7 @@ class AICacheService:
         """Get cached scenario analysis result"""
         
         cache_key = self._generate_cache_key("scenario_analysis", pdf_content)
-        cached_data = redis_manager.get(cache_key)
+        cached_data = get_redis().get(cache_key)
         
         if cached_data:
             logger.debug("Cache hit for scenario analysis")
@@ -184,7 +185,7 @@ class AICacheService:
             "cached_at": datetime.utcnow().isoformat()
         }
         
-        success = redis_manager.set(cache_key, cache_data, ttl)
+        success = get_redis().set(cache_key, cache_data, ttl)
         if success:
             logger.debug(f"Cached simulation response for simulation {simulation_id}")
         
@@ -196,7 +197,7 @@ class AICacheService:
         """Get cached simulation chat response"""
         
         cache_key = f"simulation:{simulation_id}:chat:{hashlib.md5(user_message.encode()).hexdigest()[:16]}"
-        cached_data = redis_manager.get(cache_key)
+        cached_data = get_redis().get(cache_key)
         
         if cached_data:
             logger.debug(f"Cache hit for simulation {simulation_id}")
@@ -209,12 +210,7 @@ class AICacheService:
         """Invalidate all cache entries for a specific simulation"""
         
         pattern = f"simulation:{simulation_id}:*"
-        keys = redis_manager.get_keys(pattern)
-        
-        deleted_count = 0
-        for key in keys:
-            if redis_manager.delete(key):
-                deleted_count += 1
+        deleted_count = get_cache().invalidate_cache(pattern)
         
         logger.info(f"Invalidated {deleted_count} cache entries for simulation {simulation_id}")
         return deleted_count
@@ -230,10 +226,7 @@ class AICacheService:
         
         deleted_count = 0
         for pattern in patterns:
-            keys = redis_manager.get_keys(pattern)
-            for key in keys:
-                if redis_manager.delete(key):
-                    deleted_count += 1
+            deleted_count += get_cache().invalidate_cache(pattern)
         
         logger.info(f"Invalidated {deleted_count} cache entries for user {user_id}")
         return deleted_count
@@ -252,8 +245,7 @@ class AICacheService:
         total_keys = 0
         
         for pattern in patterns:
-            keys = redis_manager.get_keys(pattern)
-            key_count = len(keys)
+            key_count = get_redis().count_keys(pattern)
             stats[pattern] = key_count
             total_keys += key_count
         
@@ -287,10 +279,10 @@ def cache_ai_response(operation: str, ttl: Optional[int] = None):
     def decorator(func):
         def wrapper(*args, **kwargs):
             # Generate cache key from function name and arguments
-            cache_key = cache_manager.generate_cache_key(f"ai_{operation}", func.__name__, *args, **kwargs)
+            cache_key = get_cache().generate_cache_key(f"ai_{operation}", func.__name__, *args, **kwargs)
             
             # Try to get from cache
-            cached_result = cache_manager.get_cached_result(cache_key)
+            cached_result = get_cache().get_cached_result(cache_key)
             if cached_result is not None:
                 logger.debug(f"Cache hit for AI function {func.__name__}")
                 return cached_result
@@ -298,7 +290,7 @@ def cache_ai_response(operation: str, ttl: Optional[int] = None):
             # Execute function and cache result
             logger.debug(f"Cache miss for AI function {func.__name__}")
             result = func(*args, **kwargs)
-            cache_manager.cache_result(cache_key, result, ttl or ai_cache_service.default_ttl)
+            get_cache().cache_result(cache_key, result, ttl or ai_cache_service.default_ttl)
             
             return result
         
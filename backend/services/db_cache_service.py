@@ -10,7 +10,8 @@ from typing import Any, Dict, Optional, Union, List, Callable
 from datetime import datetime, timedelta
 from functools import wraps
 from sqlalchemy.orm import Session
-from utilities.redis_manager import redis_manager, cache_manager
+# Getters, not the instances: importing this module must not connect to Redis
+from utilities.redis_manager import get_redis, get_cache
 
 # Logger for database cache operations
 logger = logging.getLogger(__name__)
@@ -73,7 +74,7 @@ class DatabaseCacheService:
             else:
                 ttl = self.default_ttl
         
-        success = redis_manager.set(cache_key, cache_data, ttl)
+        success = get_redis().set(cache_key, cache_data, ttl)
         if success:
             logger.debug(f"Cached database query result: {query_name}")
         
@@ -86,7 +87,7 @@ class DatabaseCacheService:
         """Get cached database query result"""
         
         cache_key = self._generate_query_cache_key(query_name, params, user_id)
-        cached_data = redis_manager.get(cache_key)
+        cached_data = get_redis().get(cache_key)
         
         if cached_data:
             logger.debug(f"Cache hit for database query: {query_name}")
@@ -101,25 +102,19 @@ class DatabaseCacheService:
                              pattern: Optional[str] = None) -> int:
         """Invalidate database query cache entries"""
         
-        if pattern:
-            keys = redis_manager.get_keys(pattern)
-        elif query_name and user_id:
-            pattern = f"db_query:{query_name}:user:{user_id}:*"
-            keys = redis_manager.get_keys(pattern)
-        elif query_name:
-            pattern = f"db_query:{query_name}:*"
-            keys = redis_manager.get_keys(pattern)
-        elif user_id:
-            pattern = f"db_query:*:user:{user_id}:*"
-            keys = redis_manager.get_keys(pattern)
-        else:
-            # Invalidate all database query caches
-            keys = redis_manager.get_keys("db_query:*")
+        if not pattern:
+            if query_name and user_id:
+                pattern = f"db_query:{query_name}:user:{user_id}:*"
+            elif query_name:
+                pattern = f"db_query:{query_name}:*"
+            elif user_id:
+                pattern = f"db_query:*:user:{user_id}:*"
+            else:
+                # Invalidate all database query caches
+                pattern = "db_query:*"
         
-        deleted_count = 0
-        for key in keys:
-            if redis_manager.delete(key):
-                deleted_count += 1
+        # Through CacheManager so this worker's in-memory copies are dropped too
+        deleted_count = get_cache().invalidate_cache(pattern)
         
         logger.info(f"Invalidated {deleted_count} database query cache entries")
         return deleted_count
@@ -135,10 +130,7 @@ class DatabaseCacheService:
         
         deleted_count = 0
         for pattern in patterns:
-            keys = redis_manager.get_keys(pattern)
-            for key in keys:
-                if redis_manager.delete(key):
-                    deleted_count += 1
+            deleted_count += get_cache().invalidate_cache(pattern)
         
         logger.info(f"Invalidated {deleted_count} user-related cache entries for user {user_id}")
         return deleted_count
@@ -154,10 +146,7 @@ class DatabaseCacheService:
         
         deleted_count = 0
         for pattern in patterns:
-            keys = redis_manager.get_keys(pattern)
-            for key in keys:
-                if redis_manager.delete(key):
-                    deleted_count += 1
+            deleted_count += get_cache().invalidate_cache(pattern)
         
         logger.info(f"Invalidated {deleted_count} scenario-related cache entries for scenario {scenario_id}")
         return deleted_count
@@ -189,7 +178,7 @@ def cache_db_query(query_name: str, ttl: Optional[int] = None, user_specific: bo
                         user_id = first_arg.id
             
             # Generate cache key
-            cache_key = cache_manager.generate_cache_key(
+            cache_key = get_cache().generate_cache_key(
                 f"db_query_{query_name}", 
                 *args, 
                 user_id=user_id,
@@ -197,7 +186,7 @@ def cache_db_query(query_name: str, ttl: Optional[int] = None, user_specific: bo
             )
             
             # Try to get from cache
-            cached_result = cache_manager.get_cached_result(cache_key)
+            cached_result = get_cache().get_cached_result(cache_key)
             if cached_result is not None:
                 logger.debug(f"Cache hit for database query: {query_name}")
                 return cached_result
@@ -214,7 +203,7 @@ def cache_db_query(query_name: str, ttl: Optional[int] = None, user_specific: bo
                 else:
                     cache_ttl = db_cache_service.default_ttl
             
-            cache_manager.cache_result(cache_key, result, cache_ttl)
+            get_cache().cache_result(cache_key, result, cache_ttl)
             
             return result
         
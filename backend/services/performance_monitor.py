@@ -3,6 +3,10 @@ Performance monitoring and metrics collection service
 Tracks API response times, database query performance, and system metrics
 """
 
+import os
+import bisect
+import glob
+import math
 import time
 import asyncio
 import logging
@@ -13,9 +17,24 @@ from functools import wraps
 import threading
 from datetime import datetime, timedelta
 
+import numpy as np
+
+# Optional long-window archive backend
+try:
+    import h5py
+    H5PY_AVAILABLE = True
+except ImportError:
+    H5PY_AVAILABLE = False
+
 # Performance monitoring
 logger = logging.getLogger(__name__)
 
+# Background stats refresh period
+STATS_INTERVAL_SECONDS = 30
+
+# Rows per HDF5 tile; each flush appends whole rows and queries only read covered tiles
+ARCHIVE_CHUNK_ROWS = 4096
+
 @dataclass
 class PerformanceMetrics:
     """Performance metrics data structure"""
@@ -42,17 +61,128 @@ class SystemStats:
     concurrent_requests: int = 0
     db_connection_pool_size: int = 0
     cache_hit_rate: float = 0.0
+    slow_requests: int = 0
+
+class P2Quantile:
+    """Streaming quantile estimate in constant memory (Jain & Chlamtac P² algorithm)"""
+    
+    __slots__ = ("q", "_heights", "_positions", "_desired", "_increments")
+    
+    def __init__(self, q: float):
+        self.q = q
+        self._heights: List[float] = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1.0, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5.0]
+        self._increments = [0.0, q / 2, q, (1 + q) / 2, 1.0]
+    
+    def add(self, x: float):
+        h = self._heights
+        if len(h) < 5:
+            bisect.insort(h, x)
+            return
+        
+        # Locate the marker cell containing x, extending the extremes if needed
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = bisect.bisect_right(h, x) - 1
+        
+        n = self._positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+        
+        # Nudge the three middle markers toward their desired positions
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = h[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not h[i - 1] < candidate < h[i + 1]:
+                    candidate = h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+                h[i] = candidate
+                n[i] += d
+    
+    def value(self) -> float:
+        h = self._heights
+        if not h:
+            return 0.0
+        if len(h) < 5:
+            return h[min(int(len(h) * self.q), len(h) - 1)]
+        return h[2]
+
+@dataclass(slots=True)
+class EndpointAgg:
+    """Running response-time aggregate for one endpoint"""
+    count: int = 0
+    sum: float = 0.0
+    mn: float = math.inf
+    mx: float = 0.0
+    p95: P2Quantile = field(default_factory=lambda: P2Quantile(0.95))
+    
+    def add(self, response_time: float):
+        self.count += 1
+        self.sum += response_time
+        if response_time < self.mn:
+            self.mn = response_time
+        if response_time > self.mx:
+            self.mx = response_time
+        self.p95.add(response_time)
+
+def _bisect_archive(timestamps, value: float, side: str) -> int:
+    """searchsorted over an archived timestamp dataset without loading it: bisect on each
+    tile's first row, then search inside the single tile that holds the boundary"""
+    total = timestamps.shape[0]
+    tile = timestamps.chunks[0] if timestamps.chunks else ARCHIVE_CHUNK_ROWS
+    
+    # Rows are appended in completion order, so timestamps are (near) sorted. Count the
+    # tiles whose first row sorts before value; the boundary lies in the last of those
+    lo, hi = 0, -(-total // tile)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        first = timestamps[mid * tile]
+        if first < value or (side == "right" and first == value):
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo == 0:
+        return 0
+    
+    offset = (lo - 1) * tile
+    block = timestamps[offset:min(offset + tile, total)]
+    return offset + int(np.searchsorted(block, value, side=side))
 
 class PerformanceMonitor:
     """Centralized performance monitoring system"""
     
-    def __init__(self, max_metrics: int = 10000):
+    def __init__(self, max_metrics: int = 10000, archive_path: Optional[str] = None):
         self.metrics: deque = deque(maxlen=max_metrics)
         self.active_requests: Dict[str, float] = {}
-        self.endpoint_stats: Dict[str, List[float]] = defaultdict(list)
+        self.endpoint_stats: Dict[str, EndpointAgg] = defaultdict(EndpointAgg)
         self.system_stats = SystemStats()
         self._lock = threading.Lock()
         
+        # Per-endpoint stats are recomputed by the background task, not per read
+        self._endpoint_stats_cache: Dict[str, Dict[str, Any]] = {}
+        self._endpoint_stats_ready = threading.Event()
+        
+        # Long-window archive: the deque stays the hot store, completed windows go to HDF5
+        self.archive_path = archive_path or os.getenv("PERF_METRICS_ARCHIVE_PATH")
+        self._archive_lock = threading.Lock()
+        self._recorded_count = 0
+        self._archived_count = 0
+        if self.archive_path and not H5PY_AVAILABLE:
+            logger.warning("[PERF] PERF_METRICS_ARCHIVE_PATH set but h5py is not installed; archiving disabled")
+            self.archive_path = None
+        
         # Performance thresholds
         self.slow_request_threshold = 5.0  # 5 seconds
         self.db_slow_query_threshold = 1.0  # 1 second
@@ -64,21 +194,33 @@ class PerformanceMonitor:
     def _start_background_tasks(self):
         """Start background tasks for metrics calculation"""
         def calculate_stats():
+            # Sleep to an absolute deadline so the period stays 30s regardless of work time
+            next_run = time.monotonic() + STATS_INTERVAL_SECONDS
             while True:
                 try:
                     self._calculate_system_stats()
-                    time.sleep(30)  # Update every 30 seconds
+                    self._flush_archive()
                 except Exception as e:
                     logger.error(f"Error calculating stats: {e}")
+                
+                delay = next_run - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                    next_run += STATS_INTERVAL_SECONDS
+                else:
+                    # Fell behind; restart the cadence rather than running back-to-back
+                    next_run = time.monotonic() + STATS_INTERVAL_SECONDS
         
         thread = threading.Thread(target=calculate_stats, daemon=True)
         thread.start()
     
     def start_request(self, endpoint: str, method: str) -> str:
         """Start tracking a request"""
-        request_id = f"{endpoint}_{method}_{time.time()}"
+        # perf_counter is monotonic, so durations survive wall-clock adjustments
+        start_time = time.perf_counter()
+        request_id = f"{endpoint}_{method}_{start_time}"
         with self._lock:
-            self.active_requests[request_id] = time.time()
+            self.active_requests[request_id] = start_time
             self.system_stats.concurrent_requests = len(self.active_requests)
         
         logger.debug(f"[PERF] Started tracking request: {request_id}")
@@ -100,9 +242,10 @@ class PerformanceMonitor:
         """End tracking a request and record metrics"""
         
         with self._lock:
-            start_time = self.active_requests.pop(request_id, time.time())
-            response_time = time.time() - start_time
+            start_time = self.active_requests.pop(request_id, None)
+            response_time = time.perf_counter() - start_time if start_time is not None else 0.0
             self.system_stats.concurrent_requests = len(self.active_requests)
+            self.endpoint_stats[f"{method} {endpoint}"].add(response_time)
         
         # Create metrics record
         metrics = PerformanceMetrics(
@@ -119,9 +262,10 @@ class PerformanceMonitor:
             error=error
         )
         
-        # Store metrics
-        self.metrics.append(metrics)
-        self.endpoint_stats[f"{method} {endpoint}"].append(response_time)
+        # Store metrics; the count and the deque move together so flushes slice the right rows
+        with self._lock:
+            self.metrics.append(metrics)
+            self._recorded_count += 1
         
         # Log slow requests
         if response_time > self.slow_request_threshold:
@@ -140,45 +284,145 @@ class PerformanceMonitor:
         if not self.metrics:
             return
         
+        # Snapshot columns under the lock, reduce them outside it
         with self._lock:
-            # Get recent metrics (last hour)
-            cutoff_time = datetime.now() - timedelta(hours=1)
-            recent_metrics = [m for m in self.metrics if m.timestamp >= cutoff_time]
-            
-            if not recent_metrics:
-                return
-            
-            response_times = [m.response_time for m in recent_metrics]
-            error_count = sum(1 for m in recent_metrics if m.status_code >= 400)
-            
-            # Calculate statistics
-            self.system_stats.avg_response_time = sum(response_times) / len(response_times)
-            self.system_stats.p95_response_time = sorted(response_times)[int(len(response_times) * 0.95)]
-            self.system_stats.total_requests = len(recent_metrics)
-            self.system_stats.error_rate = error_count / len(recent_metrics) if recent_metrics else 0.0
-            self.system_stats.peak_memory = max((m.memory_usage for m in recent_metrics), default=0.0)
-    
-    def get_endpoint_stats(self, endpoint: str, method: str) -> Dict[str, Any]:
-        """Get performance stats for a specific endpoint"""
-        key = f"{method} {endpoint}"
-        times = self.endpoint_stats.get(key, [])
+            snapshot = list(self.metrics)
         
-        if not times:
-            return {"message": "No data available"}
+        count = len(snapshot)
+        timestamps = np.fromiter((m.timestamp.timestamp() for m in snapshot), dtype=np.float64, count=count)
+        response_times = np.fromiter((m.response_time for m in snapshot), dtype=np.float64, count=count)
+        status_codes = np.fromiter((m.status_code for m in snapshot), dtype=np.int32, count=count)
+        memory_usage = np.fromiter((m.memory_usage for m in snapshot), dtype=np.float64, count=count)
         
-        recent_times = times[-100:]  # Last 100 requests
+        # Get recent metrics (last hour)
+        cutoff_time = (datetime.now() - timedelta(hours=1)).timestamp()
+        stats = _reduce_recent_metrics(
+            timestamps, response_times, status_codes, memory_usage, cutoff_time, self.slow_request_threshold
+        )
+        
+        with self._lock:
+            self.system_stats.slow_requests = stats["slow_requests"]
+            if stats["total_requests"]:
+                self.system_stats.avg_response_time = stats["avg_response_time"]
+                self.system_stats.p95_response_time = stats["p95_response_time"]
+                self.system_stats.total_requests = stats["total_requests"]
+                self.system_stats.error_rate = stats["error_rate"]
+                self.system_stats.peak_memory = stats["peak_memory"]
+        
+        self._refresh_endpoint_stats_cache()
+    
+    def _refresh_endpoint_stats_cache(self):
+        """Precompute per-endpoint stats so readers between refreshes get a dict lookup"""
+        with self._lock:
+            self._endpoint_stats_cache = {
+                key: self._compute_endpoint_stats(key, agg) for key, agg in self.endpoint_stats.items()
+            }
+        self._endpoint_stats_ready.set()
+    
+    @staticmethod
+    def _compute_endpoint_stats(key: str, agg: EndpointAgg) -> Dict[str, Any]:
+        """Summarize the running aggregate for one endpoint"""
+        method, endpoint = key.split(" ", 1)
         
         return {
             "endpoint": endpoint,
             "method": method,
-            "total_requests": len(times),
-            "recent_requests": len(recent_times),
-            "avg_response_time": sum(recent_times) / len(recent_times),
-            "min_response_time": min(recent_times),
-            "max_response_time": max(recent_times),
-            "p95_response_time": sorted(recent_times)[int(len(recent_times) * 0.95)] if len(recent_times) > 20 else max(recent_times)
+            "total_requests": agg.count,
+            "avg_response_time": agg.sum / agg.count,
+            "min_response_time": agg.mn,
+            "max_response_time": agg.mx,
+            "p95_response_time": agg.p95.value()
         }
     
+    def _flush_archive(self):
+        """Append metrics recorded since the last flush to the HDF5 archive"""
+        if not self.archive_path:
+            return
+        
+        with self._lock:
+            # Rows that fell off the deque before a flush are lost; cap at what is still held
+            pending = min(self._recorded_count - self._archived_count, len(self.metrics))
+            if pending <= 0:
+                return
+            new_metrics = list(self.metrics)[-pending:]
+            self._archived_count = self._recorded_count
+        
+        columns = {
+            "timestamp": np.fromiter((m.timestamp.timestamp() for m in new_metrics), dtype="f8", count=pending),
+            "response_time": np.fromiter((m.response_time for m in new_metrics), dtype="f4", count=pending),
+            "db_time": np.fromiter((m.db_time for m in new_metrics), dtype="f4", count=pending),
+            "ai_time": np.fromiter((m.ai_time for m in new_metrics), dtype="f4", count=pending),
+            "status_code": np.fromiter((m.status_code for m in new_metrics), dtype="i2", count=pending),
+        }
+        
+        with self._archive_lock, h5py.File(self._worker_archive_path(), "a") as f:
+            for name, values in columns.items():
+                if name not in f:
+                    f.create_dataset(
+                        name,
+                        shape=(0,),
+                        maxshape=(None,),
+                        dtype=values.dtype,
+                        chunks=(ARCHIVE_CHUNK_ROWS,),
+                        compression="lzf",
+                    )
+                dataset = f[name]
+                offset = dataset.shape[0]
+                dataset.resize((offset + pending,))
+                dataset[offset:] = values
+        
+        logger.debug(f"[PERF] Archived {pending} metrics to {self._worker_archive_path()}")
+    
+    def _worker_archive_path(self) -> str:
+        """This process's archive file: HDF5 allows a single writer, so each worker appends
+        to its own `<name>.<pid><ext>` next to the configured path"""
+        root, ext = os.path.splitext(self.archive_path)
+        return f"{root}.{os.getpid()}{ext}"
+    
+    def _archive_files(self) -> List[str]:
+        """Archive files written by every worker (including exited ones) for this path"""
+        root, ext = os.path.splitext(self.archive_path)
+        return sorted(glob.glob(f"{glob.escape(root)}.[0-9]*{glob.escape(ext)}"))
+    
+    def query_percentile(self, start: datetime, end: datetime, q: float = 0.95) -> Optional[float]:
+        """Response-time percentile over an archived window across all workers' archives,
+        reading only the tiles that cover the window"""
+        if not self.archive_path:
+            return None
+        
+        windows = []
+        for path in self._archive_files():
+            try:
+                with self._archive_lock, h5py.File(path, "r") as f:
+                    if "timestamp" not in f:
+                        continue
+                    timestamps = f["timestamp"]
+                    lo = _bisect_archive(timestamps, start.timestamp(), "left")
+                    hi = _bisect_archive(timestamps, end.timestamp(), "right")
+                    if hi > lo:
+                        windows.append(f["response_time"][lo:hi])
+            except OSError as e:
+                # Another worker is mid-flush and holds the file lock; its rows are skipped
+                logger.debug(f"[PERF] Skipping archive {path}: {e}")
+        
+        if not windows:
+            return None
+        return float(np.quantile(np.concatenate(windows), q))
+    
+    def get_endpoint_stats(self, endpoint: str, method: str) -> Dict[str, Any]:
+        """Get performance stats for a specific endpoint (refreshed every 30 seconds)"""
+        key = f"{method} {endpoint}"
+        
+        if self._endpoint_stats_ready.is_set():
+            stats = self._endpoint_stats_cache.get(key)
+        else:
+            # No background refresh has completed yet; compute directly
+            with self._lock:
+                agg = self.endpoint_stats.get(key)
+                stats = self._compute_endpoint_stats(key, agg) if agg else None
+        
+        return stats if stats else {"message": "No data available"}
+    
     def get_system_stats(self) -> Dict[str, Any]:
         """Get system-wide performance statistics"""
         return {
@@ -189,7 +433,8 @@ class PerformanceMonitor:
             "concurrent_requests": self.system_stats.concurrent_requests,
             "peak_memory_mb": round(self.system_stats.peak_memory, 2),
             "metrics_stored": len(self.metrics),
-            "slow_requests": len([m for m in self.metrics if m.response_time > self.slow_request_threshold])
+            "metrics_archived": self._archived_count if self.archive_path else 0,
+            "slow_requests": self.system_stats.slow_requests
         }
     
     def get_recent_slow_requests(self, limit: int = 10) -> List[Dict[str, Any]]:
@@ -217,6 +462,33 @@ class PerformanceMonitor:
             for m in slow_requests[:limit]
         ]
 
+def _reduce_recent_metrics(
+    timestamps: np.ndarray,
+    response_times: np.ndarray,
+    status_codes: np.ndarray,
+    memory_usage: np.ndarray,
+    cutoff_time: float,
+    slow_threshold: float
+) -> Dict[str, Any]:
+    """Vectorized reduction of metric columns into system stats for the window after cutoff_time"""
+    recent = timestamps >= cutoff_time
+    recent_times = response_times[recent]
+    total = int(recent_times.size)
+    stats = {
+        "total_requests": total,
+        "slow_requests": int(np.count_nonzero(response_times > slow_threshold)),
+    }
+    if not total:
+        return stats
+    
+    # Selection instead of a full sort for the percentile
+    p95_index = int(total * 0.95)
+    stats["avg_response_time"] = float(recent_times.mean())
+    stats["p95_response_time"] = float(np.partition(recent_times, p95_index)[p95_index])
+    stats["error_rate"] = int(np.count_nonzero(status_codes[recent] >= 400)) / total
+    stats["peak_memory"] = float(memory_usage[recent].max())
+    return stats
+
 def performance_tracker(endpoint_name: str = None):
     """Decorator to automatically track API endpoint performance"""
     def decorator(func):
@@ -227,7 +499,6 @@ def performance_tracker(endpoint_name: str = None):
             
             request_id = perf_monitor.start_request(endpoint, method)
             
-            start_time = time.time()
             db_start_queries = 0  # Could integrate with DB monitoring
             ai_start_calls = 0    # Could integrate with AI call monitoring
             
@@ -241,7 +512,6 @@ def performance_tracker(endpoint_name: str = None):
                 error = str(e)
                 raise
             finally:
-                total_time = time.time() - start_time
                 perf_monitor.end_request(
                     request_id=request_id,
                     endpoint=endpoint,
@@ -297,12 +567,12 @@ def track_db_operation(func):
     """Decorator to track database operation performance"""
     @wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
+        start_time = time.perf_counter()
         try:
             result = func(*args, **kwargs)
             return result
         finally:
-            operation_time = time.time() - start_time
+            operation_time = time.perf_counter() - start_time
             if operation_time > perf_monitor.db_slow_query_threshold:
                 logger.warning(f"[DB_PERF] Slow operation {func.__name__}: {operation_time:.3f}s")
     return wrapper
@@ -311,12 +581,12 @@ def track_ai_operation(func):
     """Decorator to track AI operation performance"""
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        start_time = time.time()
+        start_time = time.perf_counter()
         try:
             result = await func(*args, **kwargs)
             return result
         finally:
-            operation_time = time.time() - start_time
+            operation_time = time.perf_counter() - start_time
             if operation_time > perf_monitor.ai_slow_call_threshold:
                 logger.warning(f"[AI_PERF] Slow operation {func.__name__}: {operation_time:.3f}s")
     return wrapper
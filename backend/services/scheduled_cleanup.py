@@ -3,18 +3,50 @@ Scheduled Cleanup Service
 Automatically cleans up old archived records on a schedule
 """
 
-import schedule
-import time
-from datetime import datetime, date
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict
 from services.soft_deletion import SoftDeletionService
 from database.connection import get_db
 
+CLEANUP_HOUR = 2  # Jobs fire at 2:00 AM local time
+
+
+def _next_daily_run(now: datetime) -> datetime:
+    """Next 2:00 AM strictly after now"""
+    run = now.replace(hour=CLEANUP_HOUR, minute=0, second=0, microsecond=0)
+    if run <= now:
+        run += timedelta(days=1)
+    return run
+
+
+def _next_weekly_run(now: datetime) -> datetime:
+    """Next Sunday 2:00 AM strictly after now"""
+    run = now.replace(hour=CLEANUP_HOUR, minute=0, second=0, microsecond=0)
+    run += timedelta(days=(6 - run.weekday()) % 7)
+    if run <= now:
+        run += timedelta(days=7)
+    return run
+
+
+def _next_monthly_run(now: datetime) -> datetime:
+    """Next 1st-of-month 2:00 AM strictly after now"""
+    run = now.replace(day=1, hour=CLEANUP_HOUR, minute=0, second=0, microsecond=0)
+    if run <= now:
+        if run.month == 12:
+            run = run.replace(year=run.year + 1, month=1)
+        else:
+            run = run.replace(month=run.month + 1)
+    return run
+
 
 class ScheduledCleanupService:
     """Service for scheduled cleanup of archived records"""
     
     def __init__(self):
         self.cleanup_days = 30  # Default: clean archives older than 30 days
+        self._timers: Dict[str, threading.Timer] = {}
+        self._stopped = threading.Event()
     
     def set_cleanup_days(self, days: int):
         """Set the number of days after which to clean up archives"""
@@ -29,11 +61,7 @@ class ScheduledCleanupService:
             db = next(db_gen)
             service = SoftDeletionService(db)
             
-            # Get stats before cleanup
-            stats_before = service.get_archive_stats()
-            print(f"📊 Archives before cleanup: {stats_before['total_archives']}")
-            
-            # Run cleanup
+            # Run cleanup (returns the deleted count, so no pre-count scan is needed)
             cleaned_count = service.cleanup_old_archives(self.cleanup_days)
             
             # Get stats after cleanup
@@ -49,28 +77,45 @@ class ScheduledCleanupService:
             except StopIteration:
                 pass
     
-    def monthly_cleanup_wrapper(self):
-        """Wrapper that checks if it's the 1st of the month before running cleanup"""
-        if date.today().day == 1:
-            print(f"[{datetime.now()}] 📅 First day of month detected, running monthly cleanup...")
+    def _arm(self, job: str, next_run: Callable[[datetime], datetime]):
+        """Arm a one-shot timer for the job's next run; it re-arms itself after firing"""
+        if self._stopped.is_set():
+            return
+        now = datetime.now()
+        delay = (next_run(now) - now).total_seconds()
+        timer = threading.Timer(max(delay, 0.0), self._fire, args=(job, next_run))
+        timer.daemon = True
+        self._timers[job] = timer
+        timer.start()
+    
+    def _fire(self, job: str, next_run: Callable[[datetime], datetime]):
+        """Run cleanup, then schedule the next occurrence"""
+        try:
             self.run_cleanup()
-        else:
-            print(f"[{datetime.now()}] 📅 Daily check completed (not 1st of month)")
+        finally:
+            self._arm(job, next_run)
     
     def start_daily_cleanup(self):
         """Start daily cleanup at 2 AM"""
-        schedule.every().day.at("02:00").do(self.run_cleanup)
+        self._arm("daily", _next_daily_run)
         print("📅 Daily cleanup scheduled for 2:00 AM")
     
     def start_weekly_cleanup(self):
         """Start weekly cleanup on Sundays at 2 AM"""
-        schedule.every().sunday.at("02:00").do(self.run_cleanup)
+        self._arm("weekly", _next_weekly_run)
         print("📅 Weekly cleanup scheduled for Sundays at 2:00 AM")
     
     def start_monthly_cleanup(self):
         """Start monthly cleanup on the 1st at 2 AM"""
-        schedule.every().day.at("02:00").do(self.monthly_cleanup_wrapper)
-        print("📅 Daily check scheduled at 02:00; will run cleanup on the 1st of each month")
+        self._arm("monthly", _next_monthly_run)
+        print("📅 Monthly cleanup scheduled for the 1st at 2:00 AM")
+    
+    def stop(self):
+        """Cancel all pending cleanup timers"""
+        self._stopped.set()
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
     
     def run_scheduler(self):
         """Run the scheduler (blocking)"""
@@ -78,10 +123,10 @@ class ScheduledCleanupService:
         print("Press Ctrl+C to stop")
         
         try:
-            while True:
-                schedule.run_pending()
-                time.sleep(60)  # Check every minute
+            # Timers fire on their own threads; just block until stopped
+            self._stopped.wait()
         except KeyboardInterrupt:
+            self.stop()
             print("\n🛑 Scheduler stopped")
 
 
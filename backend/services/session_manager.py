@@ -20,7 +20,8 @@ from database.models import UserProgress, ScenarioScene, ScenarioPersona
 from database.models import (
     SessionMemory, ConversationSummaries, AgentSessions, CacheEntries, VectorEmbeddings
 )
-from utilities.redis_manager import redis_manager, cache_manager
+# Getters, not the instances: importing this module must not connect to Redis
+from utilities.redis_manager import get_redis, get_cache
 
 # Logger for session manager operations
 logger = logging.getLogger(__name__)
@@ -43,7 +44,7 @@ class SessionManager:
     
     def get_cache_key(self, content_type: str, content_id: int, additional_data: str = "") -> str:
         """Generate cache key for content"""
-        return cache_manager.generate_cache_key(f"session_{content_type}", content_id, additional=additional_data)
+        return get_cache().generate_cache_key(f"session_{content_type}", content_id, additional=additional_data)
     
     async def create_agent_session(self, 
                                  user_progress_id: int,
@@ -70,7 +71,7 @@ class SessionManager:
         
         # Store in Redis with TTL
         redis_key = f"session:{session_id}"
-        if not redis_manager.set(redis_key, session_data, self.session_timeout):
+        if not get_redis().set(redis_key, session_data, self.session_timeout):
             raise RuntimeError("Failed to store session in Redis")
         
         # Also store in database for persistence (optional backup)
@@ -3,11 +3,19 @@ Vector Store Service for LangChain Integration
 Provides fallback implementations when pgvector is not available
 """
 
+import asyncio
+import heapq
 import json
+import os
+import re
+import threading
+import time
 import numpy as np
-from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Union
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import bindparam, func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
 import hashlib
 import pickle
 import base64
@@ -18,23 +26,115 @@ try:
 except ImportError:
     PGVECTOR_AVAILABLE = False
 
-from database.connection import get_db, settings
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+from database.connection import engine, scoped_session, settings
 from database.models import VectorEmbeddings
 from langchain_config import langchain_manager, settings as langchain_settings
 
+# Process-wide LRU of provider embeddings, shared by all VectorStoreService instances
+EMBEDDING_CACHE_SIZE = 10_000
+_embedding_cache: "OrderedDict[bytes, List[float]]" = OrderedDict()
+_embedding_cache_lock = threading.Lock()
+
+# Dimension every stored and query embedding is padded or truncated to
+EMBEDDING_DIMENSION = 1536
+
+# Valid collection names: alphanumeric characters, underscores, and hyphens
+_COLLECTION_NAME_RE = re.compile(r"^[A-Za-z0-9_-]+\Z")
+
+# Rows fetched and scored per block when scanning a collection in the fallback search
+STREAM_BLOCK_ROWS = 1000
+
+# Seconds a cached FAISS index is trusted before its collection version (row count and
+# latest updated_at) is re-read, so writes from other workers show up within this window
+FAISS_VERSION_CHECK_SECONDS = 5.0
+
+# Texts sent to the embeddings provider per aembed_documents call during bulk ingestion
+EMBEDDING_BATCH_SIZE = 256
+# Provider batch calls allowed in flight at once during bulk ingestion
+EMBEDDING_CONCURRENCY = 8
+
+if PGVECTOR_AVAILABLE:
+    # The query vector is bound once as a typed pgvector parameter rather than
+    # formatted into the SQL text for each of its two uses. Embeddings are stored
+    # unit-normalized (rows older than that are rescaled by migration a9d3f5c7e1b2),
+    # so the negative inner product (<#>) ranks like cosine distance
+    _STMT_PGVECTOR_SEARCH = text("""
+        SELECT content_hash,
+               original_content,
+               content_metadata,
+               -(embedding_vector <#> :q) AS similarity_score
+        FROM vector_embeddings
+        WHERE content_type = :ct
+        ORDER BY embedding_vector <#> :q
+        LIMIT :k
+    """).bindparams(
+        bindparam("q", type_=Vector(EMBEDDING_DIMENSION)),
+        bindparam("ct"),
+        bindparam("k")
+    )
+
+# Content hash behind document IDs and fallback seeds. SHA-256 (default) keeps IDs of
+# existing documents stable; "blake3" is faster on large content but changes every ID
+DOCUMENT_ID_HASH = os.getenv("VECTOR_DOCUMENT_ID_HASH", "sha256").lower()
+
+def _content_digest(content: Union[str, bytes]) -> bytes:
+    """32-byte digest of document content, hashing bytes input without a re-encode"""
+    if isinstance(content, str):
+        content = content.encode()
+    if DOCUMENT_ID_HASH == "blake3" and BLAKE3_AVAILABLE:
+        return blake3.blake3(content).digest(length=32)
+    return hashlib.sha256(content).digest()
+
+def _dumps_sorted(obj: Any) -> bytes:
+    """Metadata bytes behind document IDs: the exact json.dumps(sort_keys=True) layout that
+    existing IDs were hashed from, so re-storing a document updates its row"""
+    return json.dumps(obj, sort_keys=True).encode()
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _score_all(codes, scales, query, out):
+        """Dot every int8 code row with the query and rescale, without an upcast copy of the matrix"""
+        for i in prange(codes.shape[0]):
+            acc = 0.0
+            for j in range(codes.shape[1]):
+                acc += codes[i, j] * query[j]
+            out[i] = acc * scales[i]
+
 class VectorStoreService:
     """
     Vector store service with fallback implementations
     """
     
     def __init__(self, embedding_model: str = None):
-        import os
         # Enable pgvector only when both the package and an explicit flag are present.
         self.pgvector_available = PGVECTOR_AVAILABLE and os.getenv("PGVECTOR_ENABLED", "0") == "1"
         # Instantiate embeddings provider
         self.embeddings_model = langchain_manager.embeddings
         # Use provided embedding model or get from config with fallback
         self.embedding_model = embedding_model or self._get_configured_embedding_model()
+        # Resolved once; the provider is fixed for the lifetime of the instance
+        self._target_dim = EMBEDDING_DIMENSION
+        # Per-collection in-memory FAISS index for the fallback search:
+        # (index, row payloads, collection version, monotonic time the version was last checked)
+        self._faiss: Dict[str, Tuple[Any, List[Tuple[str, str, Any]], Tuple[int, Any], float]] = {}
     
     def _get_configured_embedding_model(self) -> str:
         """Get the configured embedding model with fallback"""
@@ -49,7 +149,6 @@ class VectorStoreService:
             pass
         
         # Fallback to environment variable
-        import os
         env_model = os.getenv('EMBEDDING_MODEL')
         if env_model:
             return env_model
@@ -66,12 +165,16 @@ class VectorStoreService:
         Store text content as embedding with metadata
         """
         try:
+            # Hash the content once when it is needed for the document ID; the hash-based
+            # fallback embedding reuses the same digest
+            content_digest = None if document_id else _content_digest(content)
+            
             # Generate embedding
-            embedding_vector = await self._generate_embedding(content)
+            embedding_vector = await self._generate_embedding(content, content_digest)
             
             # Generate document ID if not provided
             if not document_id:
-                document_id = self._generate_document_id(content, metadata)
+                document_id = self._generate_document_id(content, metadata, content_digest)
             
             # Store in database
             if self.pgvector_available:
@@ -87,8 +190,173 @@ class VectorStoreService:
             print(f"Error storing embedding: {e}")
             return None
     
-    async def _generate_embedding(self, text: str) -> List[float]:
+    def _embedding_cache_key(self, text: str) -> bytes:
+        """Cache key for a text under the current embedding model"""
+        return hashlib.blake2b(
+            text.encode(), digest_size=16, person=self.embedding_model.encode()[:16]
+        ).digest()
+    
+    @staticmethod
+    def _embedding_cache_get(key: bytes) -> Optional[List[float]]:
+        """Return a cached embedding and mark it most recently used"""
+        with _embedding_cache_lock:
+            embedding = _embedding_cache.get(key)
+            if embedding is not None:
+                _embedding_cache.move_to_end(key)
+            return embedding
+    
+    @staticmethod
+    def _embedding_cache_put(key: bytes, embedding: List[float]) -> None:
+        """Cache an embedding, evicting the least recently used entries over the cap"""
+        with _embedding_cache_lock:
+            _embedding_cache[key] = embedding
+            _embedding_cache.move_to_end(key)
+            while len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+                _embedding_cache.popitem(last=False)
+    
+    async def store_embeddings_bulk(self,
+                                    contents: List[str],
+                                    metadatas: List[Dict[str, Any]] = None,
+                                    collection_name: str = "default",
+                                    document_ids: List[str] = None,
+                                    batch_size: int = EMBEDDING_BATCH_SIZE,
+                                    concurrency: int = EMBEDDING_CONCURRENCY) -> List[Optional[str]]:
+        """
+        Store many text contents as embeddings, embedding batches concurrently (one provider
+        call each) and writing all rows with one paged upsert
+        """
+        metadatas = metadatas or [None] * len(contents)
+        document_ids = document_ids or [None] * len(contents)
+        
+        # Overlap provider round-trips, bounded so bulk ingestion stays under rate limits
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self._generate_embeddings(batch)
+        
+        batch_vectors = await asyncio.gather(*(
+            embed_batch(contents[start:start + batch_size])
+            for start in range(0, len(contents), batch_size)
+        ))
+        
+        rows = []
+        vectors = (vector for batch in batch_vectors for vector in batch)
+        for content, embedding_vector, metadata, document_id in zip(contents, vectors, metadatas, document_ids):
+            document_id = document_id or self._generate_document_id(content, metadata)
+            rows.append(self._embedding_row(
+                content, embedding_vector, metadata, collection_name, document_id
+            ))
+        
+        # _bulk_upsert collapses repeated IDs; every input still gets its ID back
+        if self._bulk_upsert(rows):
+            return [row["content_hash"] for row in rows]
+        return [None] * len(rows)
+    
+    def _embedding_row(self,
+                       content: str,
+                       embedding_vector: List[float],
+                       metadata: Dict[str, Any],
+                       collection_name: str,
+                       document_id: str,
+                       fallback: bool = None) -> Dict[str, Any]:
+        """Build a vector_embeddings row for the pgvector or the fallback (JSON) storage layout"""
+        if fallback is None:
+            fallback = not self.pgvector_available
+        if not fallback:
+            embedding_model = self.embedding_model
+            content_metadata = metadata
+        else:
+            embedding_model = f"fallback-{self.embedding_model}"
+            # The vector itself lives only in embedding_vector
+            content_metadata = {
+                "content": content,
+                "metadata": metadata or {},
+                "collection_name": collection_name,
+                "document_id": document_id
+            }
+        embedding_int8, embedding_scale = self._quantize_int8(embedding_vector)
+        return {
+            "content_type": collection_name,
+            "content_id": 0,
+            "content_hash": document_id,
+            "embedding_vector": embedding_vector,
+            "embedding_model": embedding_model,
+            "embedding_dimension": len(embedding_vector),
+            "embedding_int8": embedding_int8,
+            "embedding_scale": embedding_scale,
+            "original_content": content,
+            "content_metadata": content_metadata
+        }
+    
+    def _bulk_upsert(self, rows: List[Dict[str, Any]]) -> bool:
+        """Insert or update many embedding rows with batched INSERT ... ON CONFLICT statements"""
+        if not rows:
+            return True
+        # PostgreSQL rejects a statement whose VALUES hit the same conflict key twice, so keep
+        # only the last row per (content_hash, content_type), as sequential upserts would
+        rows = list({(row["content_hash"], row["content_type"]): row for row in rows}.values())
+        try:
+            dialect = postgresql if engine.dialect.name == "postgresql" else sqlite
+            insert_stmt = dialect.insert(VectorEmbeddings.__table__)
+            stmt = insert_stmt.on_conflict_do_update(
+                index_elements=["content_hash", "content_type"],
+                set_={
+                    "original_content": insert_stmt.excluded.original_content,
+                    "embedding_vector": insert_stmt.excluded.embedding_vector,
+                    "embedding_model": insert_stmt.excluded.embedding_model,
+                    "embedding_dimension": insert_stmt.excluded.embedding_dimension,
+                    "embedding_int8": insert_stmt.excluded.embedding_int8,
+                    "embedding_scale": insert_stmt.excluded.embedding_scale,
+                    "content_metadata": insert_stmt.excluded.content_metadata,
+                    "updated_at": func.now()
+                }
+            )
+            # executemany on a Core connection: SQLAlchemy pages the rows into multi-row
+            # VALUES statements (insertmanyvalues_page_size) without ORM instrumentation
+            with engine.begin() as conn:
+                conn.execute(stmt, rows)
+            for collection_name in {row["content_type"] for row in rows}:
+                self._invalidate_faiss_index(collection_name)
+            return True
+            
+        except Exception as e:
+            print(f"Error bulk storing embeddings: {e}")
+            return False
+    
+    async def _generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for a batch of texts with one provider call"""
+        keys = [self._embedding_cache_key(text) for text in texts]
+        embeddings = [self._embedding_cache_get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            return embeddings
+        
+        try:
+            missing_texts = [texts[i] for i in missing]
+            if hasattr(self.embeddings_model, 'aembed_documents'):
+                vectors = await self.embeddings_model.aembed_documents(missing_texts)
+            else:
+                vectors = self.embeddings_model.embed_documents(missing_texts)
+            
+            for i, vector in zip(missing, vectors):
+                embeddings[i] = self._finalize_embedding(vector)
+                self._embedding_cache_put(keys[i], embeddings[i])
+        except Exception as e:
+            print(f"Error generating batch embeddings: {e}")
+            # Embed the remaining texts one at a time, which falls back per text on error
+            for i in missing:
+                if embeddings[i] is None:
+                    embeddings[i] = await self._generate_embedding(texts[i])
+        
+        return embeddings
+    
+    async def _generate_embedding(self, text: str, content_digest: bytes = None) -> List[float]:
         """Generate embedding for text (async version)"""
+        key = self._embedding_cache_key(text)
+        cached = self._embedding_cache_get(key)
+        if cached is not None:
+            return cached
         try:
             # Use LangChain embeddings - check if async method exists
             if hasattr(self.embeddings_model, 'aembed_query'):
@@ -97,78 +365,83 @@ class VectorStoreService:
                 # Fall back to sync method
                 embedding = self.embeddings_model.embed_query(text)
             
-            return self._normalize_embedding_dimensions(embedding)
+            embedding = self._finalize_embedding(embedding)
+            self._embedding_cache_put(key, embedding)
+            return embedding
         except Exception as e:
             print(f"Error generating embedding: {e}")
             # Fallback to simple hash-based embedding
-            return self._generate_fallback_embedding(text)
+            return self._generate_fallback_embedding(text, content_digest)
     
-    def _generate_embedding_sync(self, text: str) -> List[float]:
+    def _generate_embedding_sync(self, text: str, content_digest: bytes = None) -> List[float]:
         """Generate embedding for text (sync version)"""
+        key = self._embedding_cache_key(text)
+        cached = self._embedding_cache_get(key)
+        if cached is not None:
+            return cached
         try:
             # Use LangChain embeddings sync method
             embedding = self.embeddings_model.embed_query(text)
-            return self._normalize_embedding_dimensions(embedding)
+            embedding = self._finalize_embedding(embedding)
+            self._embedding_cache_put(key, embedding)
+            return embedding
         except Exception as e:
             print(f"Error generating embedding: {e}")
             # Fallback to simple hash-based embedding
-            return self._generate_fallback_embedding(text)
+            return self._generate_fallback_embedding(text, content_digest)
+    
+    def _finalize_embedding(self, embedding: List[float]) -> List[float]:
+        """Normalize dimensions, then scale to unit length so cosine similarity is a plain dot product"""
+        return self._unit_normalize(self._normalize_embedding_dimensions(embedding))
+    
+    @staticmethod
+    def _unit_normalize(vector: np.ndarray) -> List[float]:
+        """Scale a vector to unit L2 norm, leaving zero vectors unchanged"""
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        return vector.tolist()
     
-    def _normalize_embedding_dimensions(self, embedding: List[float]) -> List[float]:
+    @staticmethod
+    def _quantize_int8(embedding: List[float]) -> Tuple[bytes, float]:
+        """Symmetric per-vector int8 quantization; returns (codes, scale) with vector ~= codes * scale"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        peak = float(np.abs(vector).max()) if vector.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        codes = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        return codes.tobytes(), scale
+    
+    def _normalize_embedding_dimensions(self, embedding: List[float]) -> np.ndarray:
         """Normalize embedding dimensions to 1536 for consistency"""
-        # Convert to plain Python list if it's a NumPy array
-        if hasattr(embedding, 'tolist'):
-            embedding = embedding.tolist()
-        
-        # Ensure we have the right dimension (1536 for OpenAI, 384 for HuggingFace)
-        if len(embedding) == 384:
-            # Pad to 1536 dimensions for consistency
-            embedding = embedding + [0.0] * (1536 - 384)
-        elif len(embedding) != 1536:
-            # Truncate or pad to 1536 dimensions
-            if len(embedding) > 1536:
-                embedding = embedding[:1536]
-            else:
-                embedding = embedding + [0.0] * (1536 - len(embedding))
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.size == self._target_dim:
+            return vector
         
-        return embedding
+        # Zero-pad shorter embeddings (e.g. 384 for HuggingFace) and truncate longer ones
+        normalized = np.zeros(self._target_dim, dtype=np.float32)
+        size = min(vector.size, self._target_dim)
+        normalized[:size] = vector[:size]
+        return normalized
     
-    def _generate_fallback_embedding(self, text: str) -> List[float]:
+    def _generate_fallback_embedding(self, text: str, content_digest: bytes = None) -> List[float]:
         """Generate a simple fallback embedding when OpenAI is not available"""
-        # Create a deterministic embedding based on text hash using BLAKE2b
-        text_hash = hashlib.blake2b(text.encode(), digest_size=32).hexdigest()
-        
-        # Generate 1536 bytes of entropy by iteratively hashing
-        embedding_bytes = bytearray()
-        counter = 0
-        
-        while len(embedding_bytes) < 1536:
-            # Create hash with counter for additional entropy
-            counter_bytes = counter.to_bytes(4, byteorder='big')
-            chunk_hash = hashlib.blake2b(
-                text.encode() + counter_bytes, 
-                digest_size=min(64, 1536 - len(embedding_bytes))
-            ).digest()
-            embedding_bytes.extend(chunk_hash)
-            counter += 1
-        
-        # Convert bytes to 1536-dimensional vector
-        embedding = []
-        for i in range(1536):
-            # Map byte to float in range [-1, 1] to avoid long tails of zeros
-            byte_val = embedding_bytes[i]
-            # Normalize: (byte_val / 255.0) * 2 - 1 maps [0,255] to [-1,1]
-            value = (byte_val / 255.0) * 2.0 - 1.0
-            embedding.append(value)
-        
-        return embedding
+        # Create a deterministic embedding by seeding a PRNG from the content digest of the text,
+        # the same digest the document ID is built from
+        if content_digest is None:
+            content_digest = _content_digest(text)
+        seed = int.from_bytes(content_digest[:8], "big")
+        rng = np.random.default_rng(seed)
+        # Uniform in [-1, 1] to avoid long tails of zeros
+        return self._unit_normalize(rng.uniform(-1.0, 1.0, self._target_dim).astype(np.float32))
     
-    def _generate_document_id(self, content: str, metadata: Dict[str, Any] = None) -> str:
+    def _generate_document_id(self, content: Union[str, bytes], metadata: Dict[str, Any] = None,
+                              content_digest: bytes = None) -> str:
         """Generate a unique document ID"""
-        content_hash = hashlib.sha256(content.encode()).hexdigest()
+        if content_digest is None:
+            content_digest = _content_digest(content)
+        content_hash = content_digest.hex()
         if metadata:
-            metadata_str = json.dumps(metadata, sort_keys=True)
-            metadata_hash = hashlib.sha256(metadata_str.encode()).hexdigest()
+            metadata_hash = hashlib.sha256(_dumps_sorted(metadata)).hexdigest()
             return f"{content_hash}_{metadata_hash[:16]}"
         return content_hash
     
@@ -179,51 +452,17 @@ class VectorStoreService:
                                  collection_name: str,
                                  document_id: str) -> str:
         """Store embedding using pgvector"""
-        db_gen = get_db()
-        try:
-            db = next(db_gen)
-            
-            # Check if document already exists
-            existing = db.query(VectorEmbeddings).filter(
-                VectorEmbeddings.content_hash == document_id,
-                VectorEmbeddings.content_type == collection_name
-            ).first()
-            
-            if existing:
-                # Update existing
-                existing.original_content = content
-                existing.embedding_vector = embedding_vector
-                existing.content_metadata = metadata
-                db.commit()
-                return document_id
-            
-            # Create new embedding store entry
-            embedding_store = VectorEmbeddings(
-                content_type=collection_name,
-                content_id=0,  # We'll use content_hash as the unique identifier
-                content_hash=document_id,
-                embedding_vector=embedding_vector,
-                embedding_model=self.embedding_model,
-                embedding_dimension=len(embedding_vector),
-                original_content=content,
-                content_metadata=metadata
-            )
-            
-            db.add(embedding_store)
-            db.commit()
+        # A single upsert replaces the existence SELECT followed by INSERT or UPDATE
+        row = self._embedding_row(
+            content, embedding_vector, metadata, collection_name, document_id, fallback=False
+        )
+        if self._bulk_upsert([row]):
             return document_id
-            
-        except Exception as e:
-            print(f"Error storing with pgvector: {e}")
-            # Fallback to non-vector storage
-            return await self._store_with_fallback(
-                content, embedding_vector, metadata, collection_name, document_id
-            )
-        finally:
-            try:
-                next(db_gen)  # This will trigger the finally block in get_db()
-            except StopIteration:
-                pass  # Generator is already closed
+        
+        # Fallback to non-vector storage
+        return await self._store_with_fallback(
+            content, embedding_vector, metadata, collection_name, document_id
+        )
     
     async def _store_with_fallback(self, 
                                  content: str, 
@@ -232,56 +471,10 @@ class VectorStoreService:
                                  collection_name: str,
                                  document_id: str) -> str:
         """Store embedding using fallback method (JSON storage)"""
-        db_gen = get_db()
-        try:
-            db = next(db_gen)
-            
-            # Store as JSON in embedding_vector field (fallback when pgvector not available)
-            embedding_data = {
-                "embedding": embedding_vector,
-                "content": content,
-                "metadata": metadata or {},
-                "collection_name": collection_name,
-                "document_id": document_id
-            }
-            
-            # Check if document already exists
-            existing = db.query(VectorEmbeddings).filter(
-                VectorEmbeddings.content_hash == document_id,
-                VectorEmbeddings.content_type == collection_name
-            ).first()
-            
-            if existing:
-                # Update existing
-                existing.original_content = content
-                existing.content_metadata = embedding_data
-                db.commit()
-                return document_id
-            
-            # Create new entry (store vector in metadata since pgvector column is required)
-            embedding_store = VectorEmbeddings(
-                content_type=collection_name,
-                content_id=0,
-                content_hash=document_id,
-                embedding_vector=embedding_vector,  # Store the actual vector
-                embedding_model=f"fallback-{self.embedding_model}",
-                embedding_dimension=len(embedding_vector),
-                original_content=content,
-                content_metadata=embedding_data
-            )
-            
-            db.add(embedding_store)
-            db.commit()
-            return document_id
-            
-        except Exception as e:
-            print(f"Error storing with fallback: {e}")
-            return None
-        finally:
-            try:
-                next(db_gen)  # This will trigger the finally block in get_db()
-            except StopIteration:
-                pass  # Generator is already closed
+        row = self._embedding_row(
+            content, embedding_vector, metadata, collection_name, document_id, fallback=True
+        )
+        return document_id if self._bulk_upsert([row]) else None
     
     async def similarity_search(self, 
                               query: str, 
@@ -318,75 +511,49 @@ class VectorStoreService:
         if not self.pgvector_available:
             return await self._similarity_search_fallback(query_embedding, collection_name, k, score_threshold)
         
-        db_gen = get_db()
-        try:
-            db = next(db_gen)
-            
-            # Use pgvector similarity search
-            # Validate and convert embedding to proper format
-            if not isinstance(query_embedding, (list, tuple, np.ndarray)):
-                raise ValueError("query_embedding must be a list, tuple, or numpy array")
-            
-            # Convert to plain Python list of floats
-            if hasattr(query_embedding, 'tolist'):
-                embedding_list = query_embedding.tolist()
-            else:
-                embedding_list = [float(x) for x in query_embedding]
-            
-            # Ensure pgvector extension is registered
-            from pgvector.sqlalchemy import Vector
-            
-            # Validate collection_name to prevent SQL injection
-            if not collection_name or not isinstance(collection_name, str):
-                raise ValueError("Invalid collection_name")
-            
-            # Only allow alphanumeric characters, underscores, and hyphens
-            import re
-            if not re.match(r'^[a-zA-Z0-9_-]+$', collection_name):
-                raise ValueError("Invalid collection_name: only alphanumeric characters, underscores, and hyphens are allowed")
-            
-            # Use parameterized query with proper pgvector syntax
-            # Convert embedding list to pgvector literal format
-            embedding_str = "[" + ",".join(map(str, embedding_list)) + "]"
-            
-            # Use parameterized query to prevent SQL injection
-            query = """
-                SELECT content_hash,
-                       original_content,
-                       content_metadata,
-                       1 - (embedding_vector <=> %s::vector) AS similarity_score
-                FROM vector_embeddings
-                WHERE content_type = %s
-                ORDER BY embedding_vector <=> %s::vector
-                LIMIT %s
-            """
-            
-            results = db.execute(text(query), (embedding_str, collection_name, embedding_str, k)).fetchall()
-            
-            # Filter by score threshold and format results
-            filtered_results = []
-            for row in results:
-                if row.similarity_score >= score_threshold:
-                    filtered_results.append({
-                        "document_id": row.content_hash,
-                        "content": row.original_content,
-                        "metadata": row.content_metadata or {},
-                        "score": row.similarity_score
-                    })
-            
-            return filtered_results
-            
-        except Exception as e:
-            print(f"Error in pgvector similarity search: {e}")
-            # Fallback to non-vector search
-            return await self._similarity_search_fallback(
-                query_embedding, collection_name, k, score_threshold
-            )
-        finally:
+        with scoped_session() as db:
             try:
-                next(db_gen)  # This will trigger the finally block in get_db()
-            except StopIteration:
-                pass  # Generator is already closed
+                # Use pgvector similarity search
+                # Validate and convert embedding to proper format
+                if not isinstance(query_embedding, (list, tuple, np.ndarray)):
+                    raise ValueError("query_embedding must be a list, tuple, or numpy array")
+                
+                # Compact float32 array; the Vector bind type serializes it once for both uses of :q
+                embedding_array = np.asarray(query_embedding, dtype=np.float32)
+                
+                # Validate collection_name to prevent SQL injection
+                if not collection_name or not isinstance(collection_name, str):
+                    raise ValueError("Invalid collection_name")
+                
+                # Only allow alphanumeric characters, underscores, and hyphens
+                if not _COLLECTION_NAME_RE.match(collection_name):
+                    raise ValueError("Invalid collection_name: only alphanumeric characters, underscores, and hyphens are allowed")
+                
+                # Use parameterized query to prevent SQL injection
+                results = db.execute(
+                    _STMT_PGVECTOR_SEARCH,
+                    {"q": embedding_array, "ct": collection_name, "k": k}
+                ).fetchall()
+                
+                # Filter by score threshold and format results
+                filtered_results = []
+                for row in results:
+                    if row.similarity_score >= score_threshold:
+                        filtered_results.append({
+                            "document_id": row.content_hash,
+                            "content": row.original_content,
+                            "metadata": row.content_metadata or {},
+                            "score": row.similarity_score
+                        })
+                
+                return filtered_results
+                
+            except Exception as e:
+                print(f"Error in pgvector similarity search: {e}")
+                # Fallback to non-vector search
+                return await self._similarity_search_fallback(
+                    query_embedding, collection_name, k, score_threshold
+                )
     
     async def _similarity_search_fallback(self, 
                                         query_embedding: List[float],
@@ -394,84 +561,217 @@ class VectorStoreService:
                                         k: int,
                                         score_threshold: float) -> List[Dict[str, Any]]:
         """Similarity search using fallback method (cosine similarity)"""
-        db_gen = get_db()
-        try:
-            db = next(db_gen)
-            
-            # Get all embeddings from collection
-            embeddings_data = db.query(VectorEmbeddings).filter(
-                VectorEmbeddings.content_type == collection_name
-            ).all()
-            
-            if not embeddings_data:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if k <= 0:
+            return []
+        
+        if FAISS_AVAILABLE:
+            try:
+                return self._similarity_search_faiss(query, collection_name, k, score_threshold)
+            except Exception as e:
+                # Drop the possibly broken index and answer from the block scan below instead
+                print(f"Error in FAISS similarity search, falling back to block scan: {e}")
+                self._invalidate_faiss_index(collection_name)
+        
+        with scoped_session() as db:
+            try:
+                # Min-heap of the best k (score, arrival order, row payload) seen so far
+                top = []
+                order = 0
+                for codes, scales, candidates in self._iter_collection_blocks(db, collection_name, query.size):
+                    scores = self._score_codes(codes, scales, query)
+                    
+                    # Threshold, then keep at most k of this block without sorting every score
+                    hits = np.flatnonzero(scores >= score_threshold)
+                    if hits.size > k:
+                        hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+                    
+                    for i in hits:
+                        entry = (float(scores[i]), order, candidates[i])
+                        order += 1
+                        if len(top) < k:
+                            heapq.heappush(top, entry)
+                        elif entry[0] > top[0][0]:
+                            heapq.heapreplace(top, entry)
+                
+                return [
+                    {
+                        "document_id": content_hash,
+                        "content": content,
+                        "metadata": content_metadata,
+                        "score": score
+                    }
+                    for score, _, (content_hash, content, content_metadata) in sorted(top, reverse=True)
+                ]
+                
+            except Exception as e:
+                print(f"Error in fallback similarity search: {e}")
                 return []
-            
-            # Calculate similarities
-            similarities = []
-            for item in embeddings_data:
-                # Try to get embedding from embedding_vector field first (fallback storage)
+    
+    @staticmethod
+    def _score_codes(codes: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of int8-coded unit vectors against a unit query"""
+        # Embeddings are stored unit-normalized, so cosine similarity is a dot product
+        # over the int8 codes rescaled by each row's scale
+        if NUMBA_AVAILABLE:
+            scores = np.empty(codes.shape[0], dtype=np.float32)
+            _score_all(codes, scales, query, scores)
+            return scores
+        # Upcast so the product runs as a single BLAS GEMV
+        return (codes.astype(np.float32) @ query) * scales
+    
+    def _iter_collection_blocks(self, db: Session, collection_name: str, dimension: int):
+        """
+        Stream a collection's stored embeddings as (int8 codes, scales, row payloads) blocks of
+        at most STREAM_BLOCK_ROWS rows, so the working set stays bounded by the block size
+        """
+        # Quantized rows: only the compact int8 codes are transferred
+        quantized_rows = db.execute(
+            select(
+                VectorEmbeddings.content_hash,
+                VectorEmbeddings.original_content,
+                VectorEmbeddings.content_metadata,
+                VectorEmbeddings.embedding_int8,
+                VectorEmbeddings.embedding_scale
+            ).where(
+                VectorEmbeddings.content_type == collection_name,
+                VectorEmbeddings.embedding_int8.isnot(None)
+            ).execution_options(yield_per=STREAM_BLOCK_ROWS)
+        )
+        for rows in quantized_rows.partitions():
+            codes = np.empty((len(rows), dimension), dtype=np.int8)
+            scales = np.empty(len(rows), dtype=np.float32)
+            candidates = []
+            for content_hash, content, content_metadata, embedding_int8, embedding_scale in rows:
+                # Rows whose dimension does not match the query cannot be compared
+                if len(embedding_int8) == dimension:
+                    codes[len(candidates)] = np.frombuffer(embedding_int8, dtype=np.int8)
+                    scales[len(candidates)] = embedding_scale
+                    candidates.append((content_hash, content, content_metadata))
+            if candidates:
+                yield codes[:len(candidates)], scales[:len(candidates)], candidates
+        
+        # Rows stored before quantization (and possibly before unit normalization, if the
+        # normalizing migration has not run): normalize and quantize the float vector here
+        float_rows = db.execute(
+            select(
+                VectorEmbeddings.content_hash,
+                VectorEmbeddings.original_content,
+                VectorEmbeddings.content_metadata,
+                VectorEmbeddings.embedding_vector
+            ).where(
+                VectorEmbeddings.content_type == collection_name,
+                VectorEmbeddings.embedding_int8.is_(None)
+            ).execution_options(yield_per=STREAM_BLOCK_ROWS)
+        )
+        for rows in float_rows.partitions():
+            codes = np.empty((len(rows), dimension), dtype=np.int8)
+            scales = np.empty(len(rows), dtype=np.float32)
+            candidates = []
+            for content_hash, content, content_metadata, embedding_vector in rows:
+                # The embedding lives in embedding_vector (a JSON string in legacy fallback rows)
                 stored_embedding = None
-                if item.embedding_vector:
+                if embedding_vector is not None and len(embedding_vector):
                     try:
                         # If it's a JSON string, parse it
-                        if isinstance(item.embedding_vector, str):
-                            embedding_data = json.loads(item.embedding_vector)
+                        if isinstance(embedding_vector, str):
+                            embedding_data = json.loads(embedding_vector)
                             stored_embedding = embedding_data.get("embedding")
                         else:
                             # If it's already a list, use it directly
-                            stored_embedding = item.embedding_vector
+                            stored_embedding = embedding_vector
                     except (json.JSONDecodeError, TypeError):
                         pass
                 
-                # Fallback to content_metadata if embedding_vector doesn't have the data
-                if not stored_embedding and item.content_metadata and "embedding" in item.content_metadata:
-                    stored_embedding = item.content_metadata["embedding"]
-                
-                if stored_embedding:
-                    similarity = self._cosine_similarity(query_embedding, stored_embedding)
-                    if similarity >= score_threshold:
-                        similarities.append({
-                            "document_id": item.content_hash,
-                            "content": item.original_content,
-                            "metadata": item.content_metadata,
-                            "score": similarity
-                        })
-            
-            # Sort by similarity and return top k
-            similarities.sort(key=lambda x: x["score"], reverse=True)
-            return similarities[:k]
-            
-        except Exception as e:
-            print(f"Error in fallback similarity search: {e}")
+                # Rows whose dimension does not match the query cannot be compared
+                if stored_embedding is not None and len(stored_embedding) == dimension:
+                    row_codes, row_scale = self._quantize_int8(
+                        self._unit_normalize(np.asarray(stored_embedding, dtype=np.float32))
+                    )
+                    codes[len(candidates)] = np.frombuffer(row_codes, dtype=np.int8)
+                    scales[len(candidates)] = row_scale
+                    candidates.append((content_hash, content, content_metadata))
+            if candidates:
+                yield codes[:len(candidates)], scales[:len(candidates)], candidates
+    
+    def _similarity_search_faiss(self,
+                                 query: np.ndarray,
+                                 collection_name: str,
+                                 k: int,
+                                 score_threshold: float) -> List[Dict[str, Any]]:
+        """Similarity search against the collection's in-memory FAISS index"""
+        index, candidates = self._get_faiss_index(collection_name, query.size)
+        if not candidates:
             return []
-        finally:
-            try:
-                next(db_gen)  # This will trigger the finally block in get_db()
-            except StopIteration:
-                pass  # Generator is already closed
+        
+        # Inner product of L2-normalized vectors is their cosine similarity
+        query = query.reshape(1, -1).copy()
+        faiss.normalize_L2(query)
+        scores, ids = index.search(query, min(k, index.ntotal))
+        
+        return [
+            {
+                "document_id": candidates[i][0],
+                "content": candidates[i][1],
+                "metadata": candidates[i][2],
+                "score": float(score)
+            }
+            for score, i in zip(scores[0], ids[0])
+            if i >= 0 and score >= score_threshold
+        ]
+    
+    def _get_faiss_index(self, collection_name: str, dimension: int) -> Tuple[Any, List[Tuple[str, str, Any]]]:
+        """Return the collection's FAISS index, rebuilding it when the collection has changed.
+        
+        Local writes drop the index directly; writes from other processes are caught by
+        comparing the collection version at most every FAISS_VERSION_CHECK_SECONDS.
+        """
+        cached = self._faiss.get(collection_name)
+        if cached is not None and cached[0].d == dimension:
+            index, candidates, version, checked_at = cached
+            now = time.monotonic()
+            if now - checked_at < FAISS_VERSION_CHECK_SECONDS:
+                return index, candidates
+            with scoped_session() as db:
+                current_version = self._collection_version(db, collection_name)
+            if current_version == version:
+                self._faiss[collection_name] = (index, candidates, version, now)
+                return index, candidates
+        
+        index = faiss.IndexFlatIP(dimension)
+        candidates = []
+        with scoped_session() as db:
+            # Read before the rows so a concurrent write forces another rebuild, never a miss
+            version = self._collection_version(db, collection_name)
+            for codes, scales, block_candidates in self._iter_collection_blocks(db, collection_name, dimension):
+                # Dequantize block by block; the index itself holds float32 vectors
+                matrix = np.ascontiguousarray(codes.astype(np.float32) * scales[:, None])
+                faiss.normalize_L2(matrix)
+                index.add(matrix)
+                candidates.extend(block_candidates)
+        
+        self._faiss[collection_name] = (index, candidates, version, time.monotonic())
+        return index, candidates
+    
+    @staticmethod
+    def _collection_version(db: Session, collection_name: str) -> Tuple[int, Any]:
+        """Cheap change marker for a collection: (row count, latest updated_at)"""
+        count, last_updated = db.execute(
+            select(func.count(), func.max(VectorEmbeddings.updated_at)).where(
+                VectorEmbeddings.content_type == collection_name
+            )
+        ).one()
+        return count, last_updated
+    
+    def _invalidate_faiss_index(self, collection_name: str) -> None:
+        """Drop a collection's FAISS index so the next search rebuilds it"""
+        self._faiss.pop(collection_name, None)
     
     def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
+        """Calculate cosine similarity between two unit-normalized vectors"""
         try:
-            # Ensure both vectors are plain Python lists
-            if hasattr(vec1, 'tolist'):
-                vec1 = vec1.tolist()
-            if hasattr(vec2, 'tolist'):
-                vec2 = vec2.tolist()
-            
-            # Convert to numpy arrays
-            a = np.array(vec1, dtype=float)
-            b = np.array(vec2, dtype=float)
-            
-            # Calculate cosine similarity
-            dot_product = np.dot(a, b)
-            norm_a = np.linalg.norm(a)
-            norm_b = np.linalg.norm(b)
-            
-            if norm_a == 0 or norm_b == 0:
-                return 0.0
-            
-            return float(dot_product / (norm_a * norm_b))
+            # Stored and query embeddings are unit length, so the dot product is the cosine
+            return float(np.dot(np.asarray(vec1, dtype=np.float32), np.asarray(vec2, dtype=np.float32)))
             
         except Exception as e:
             print(f"Error calculating cosine similarity: {e}")
@@ -479,90 +779,70 @@ class VectorStoreService:
     
     async def get_document(self, document_id: str, collection_name: str = "default") -> Optional[Dict[str, Any]]:
         """Retrieve a specific document"""
-        db_gen = get_db()
-        try:
-            db = next(db_gen)
-            
-            result = db.query(VectorEmbeddings).filter(
-                VectorEmbeddings.content_hash == document_id,
-                VectorEmbeddings.content_type == collection_name
-            ).first()
-            
-            if result:
-                return {
-                    "document_id": result.content_hash,
-                    "content": result.original_content,
-                    "metadata": result.content_metadata or {},
-                    "created_at": result.created_at
-                }
-            
-            return None
-            
-        except Exception as e:
-            print(f"Error retrieving document: {e}")
-            return None
-        finally:
+        with scoped_session() as db:
             try:
-                next(db_gen)  # This will trigger the finally block in get_db()
-            except StopIteration:
-                pass  # Generator is already closed
+                result = db.query(VectorEmbeddings).filter(
+                    VectorEmbeddings.content_hash == document_id,
+                    VectorEmbeddings.content_type == collection_name
+                ).first()
+                
+                if result:
+                    return {
+                        "document_id": result.content_hash,
+                        "content": result.original_content,
+                        "metadata": result.content_metadata or {},
+                        "created_at": result.created_at
+                    }
+                
+                return None
+                
+            except Exception as e:
+                print(f"Error retrieving document: {e}")
+                return None
     
     async def delete_document(self, document_id: str, collection_name: str = "default") -> bool:
         """Delete a document"""
-        db_gen = get_db()
-        try:
-            db = next(db_gen)
-            
-            result = db.query(VectorEmbeddings).filter(
-                VectorEmbeddings.content_hash == document_id,
-                VectorEmbeddings.content_type == collection_name
-            ).first()
-            
-            if result:
-                db.delete(result)
-                db.commit()
-                return True
-            
-            return False
-            
-        except Exception as e:
-            print(f"Error deleting document: {e}")
-            return False
-        finally:
+        with scoped_session() as db:
             try:
-                next(db_gen)  # This will trigger the finally block in get_db()
-            except StopIteration:
-                pass  # Generator is already closed
+                result = db.query(VectorEmbeddings).filter(
+                    VectorEmbeddings.content_hash == document_id,
+                    VectorEmbeddings.content_type == collection_name
+                ).first()
+                
+                if result:
+                    db.delete(result)
+                    db.commit()
+                    self._invalidate_faiss_index(collection_name)
+                    return True
+                
+                return False
+                
+            except Exception as e:
+                print(f"Error deleting document: {e}")
+                return False
     
     async def get_collection_stats(self, collection_name: str = "default") -> Dict[str, Any]:
         """Get statistics for a collection"""
-        db_gen = get_db()
-        try:
-            db = next(db_gen)
-            
-            total_docs = db.query(VectorEmbeddings).filter(
-                VectorEmbeddings.content_type == collection_name
-            ).count()
-            
-            return {
-                "collection_name": collection_name,
-                "total_documents": total_docs,
-                "pgvector_available": self.pgvector_available
-            }
-            
-        except Exception as e:
-            print(f"Error getting collection stats: {e}")
-            return {
-                "collection_name": collection_name,
-                "total_documents": 0,
-                "pgvector_available": self.pgvector_available,
-                "error": str(e)
-            }
-        finally:
+        with scoped_session() as db:
             try:
-                next(db_gen)  # This will trigger the finally block in get_db()
-            except StopIteration:
-                pass  # Generator is already closed
+                total_docs = db.query(VectorEmbeddings).filter(
+                    VectorEmbeddings.content_type == collection_name
+                ).count()
+                
+                return {
+                    "collection_name": collection_name,
+                    "total_documents": total_docs,
+                    "pgvector_available": self.pgvector_available
+                }
+                
+            except Exception as e:
+                print(f"Error getting collection stats: {e}")
+                return {
+                    "collection_name": collection_name,
+                    "total_documents": 0,
+                    "pgvector_available": self.pgvector_available,
+                    "error": str(e)
+                }
 
 # Global instance - uses configured embedding model
 vector_store_service = VectorStoreService()
@@ -1,18 +1,32 @@
 """
 Authentication utilities for the CrewAI Agent Builder Platform
 """
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, Union
+from typing import Optional, Tuple, Union
 import os
-from passlib.context import CryptContext
+import threading
+import time
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends, Request
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
 from database.connection import get_db, settings
 from database.models import User
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 10 rounds (~60 ms per verify) instead of passlib's default 12 (~250 ms); every
+# extra round doubles the cost of both logins and offline brute force. Existing
+# hashes keep their own rounds and still verify.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "10"))
+_pwd_context = None
+
+def _get_pwd_context():
+    """Build the passlib context on first use; loading the bcrypt backend is slow at import"""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+    return _pwd_context
 
 # JWT settings
 SECRET_KEY = settings.secret_key
@@ -25,15 +39,34 @@ if not SECRET_KEY or not SECRET_KEY.strip():
 if len(SECRET_KEY) < 32:
     raise RuntimeError("SECRET_KEY must be at least 32 characters long for security.")
 
+# Encoded once; jose would otherwise encode the str key on every encode/decode
+_SECRET_BYTES = SECRET_KEY.encode('utf-8')
+
+# Decoded payloads of recently verified tokens, so repeat requests skip HMAC + JSON decoding
+TOKEN_CACHE_SIZE = 4096
+_token_cache: "OrderedDict[str, dict]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+# Column values of recently authenticated users; the short TTL bounds how long a
+# role or is_active change can go unnoticed when an update path does not invalidate
+USER_CACHE_TTL_SECONDS = 5
+USER_CACHE_SIZE = 10_000
+_user_cache: "OrderedDict[int, Tuple[float, dict]]" = OrderedDict()
+_user_cache_lock = threading.Lock()
+_USER_COLUMNS = tuple(attr.key for attr in User.__mapper__.column_attrs)
+
+# Marks a request whose auth cookie has not been resolved yet (None means "no valid token")
+_UNRESOLVED = object()
+
 # HttpOnly cookie-based authentication only
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return _get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Hash a password"""
-    return pwd_context.hash(password)
+    return _get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
@@ -43,16 +76,33 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _SECRET_BYTES, algorithm=ALGORITHM)
     return encoded_jwt
 
 def verify_token(token: str) -> Optional[dict]:
     """Verify and decode a JWT token"""
+    with _token_cache_lock:
+        payload = _token_cache.get(token)
+        if payload is not None:
+            # A cached token is only valid until its exp claim
+            if payload.get("exp", 0) > time.time():
+                _token_cache.move_to_end(token)
+                return dict(payload)
+            del _token_cache[token]
+    
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        payload = jwt.decode(token, _SECRET_BYTES, algorithms=[ALGORITHM])
     except JWTError:
         return None
+    
+    # Only tokens with an expiry are cached, so every entry ages out
+    if isinstance(payload.get("exp"), (int, float)):
+        with _token_cache_lock:
+            _token_cache[token] = payload
+            _token_cache.move_to_end(token)
+            while len(_token_cache) > TOKEN_CACHE_SIZE:
+                _token_cache.popitem(last=False)
+    return dict(payload)
 
 def extract_token_from_request(request: Request) -> Optional[str]:
     """Extract JWT token from HttpOnly cookie only"""
@@ -65,13 +115,66 @@ def extract_token_from_request(request: Request) -> Optional[str]:
 
 def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     """Authenticate a user with email and password"""
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
+    # Only the columns needed to check the password; the full row is loaded on success
+    row = db.query(User.id, User.password_hash).filter(User.email == email).first()
+    if not row:
         return None
-    if not verify_password(password, user.password_hash):
+    if not verify_password(password, row.password_hash):
         return None
+    return load_user(db, row.id)
+
+def load_user(db: Session, user_id: int) -> Optional[User]:
+    """Load a user by ID, serving recently loaded users from a short-lived cache"""
+    now = time.monotonic()
+    with _user_cache_lock:
+        entry = _user_cache.get(user_id)
+        if entry is not None and entry[0] <= now:
+            del _user_cache[user_id]
+            entry = None
+    
+    if entry is not None:
+        cached = User(**entry[1])
+        make_transient_to_detached(cached)
+        # Attach to this session without a SELECT; endpoints can modify and commit it as usual
+        return db.merge(cached, load=False)
+    
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is not None:
+        values = {key: getattr(user, key) for key in _USER_COLUMNS}
+        with _user_cache_lock:
+            _user_cache[user_id] = (now + USER_CACHE_TTL_SECONDS, values)
+            _user_cache.move_to_end(user_id)
+            while len(_user_cache) > USER_CACHE_SIZE:
+                _user_cache.popitem(last=False)
     return user
 
+def invalidate_cached_user(user_id: int) -> None:
+    """Drop a user from the authentication cache after their row changes"""
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+
+def resolve_token_user_id(request: Request) -> Optional[int]:
+    """Return the user ID from the request's auth cookie, or None if missing or invalid.
+    
+    The result is stored on request.state, so every auth dependency in the same
+    request shares a single cookie lookup and token verification.
+    """
+    cached = getattr(request.state, "auth_user_id", _UNRESOLVED)
+    if cached is not _UNRESOLVED:
+        return cached
+    
+    user_id = None
+    token = extract_token_from_request(request)
+    payload = verify_token(token) if token is not None else None
+    if payload is not None:
+        try:
+            user_id = int(payload.get("sub"))
+        except (ValueError, TypeError):
+            user_id = None
+    
+    request.state.auth_user_id = user_id
+    return user_id
+
 async def get_current_user(
     request: Request,
     db: Session = Depends(get_db)
@@ -82,25 +185,12 @@ async def get_current_user(
         detail="Could not validate credentials",
     )
     
-    # Extract token from HttpOnly cookie only
-    token = extract_token_from_request(request)
-    if token is None:
-        raise credentials_exception
-    
-    payload = verify_token(token)
-    if payload is None:
-        raise credentials_exception
-    
-    user_id_str: str = payload.get("sub")
-    if user_id_str is None:
+    # Token from HttpOnly cookie only
+    user_id = resolve_token_user_id(request)
+    if user_id is None:
         raise credentials_exception
     
-    try:
-        user_id = int(user_id_str)
-    except (ValueError, TypeError):
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.id == user_id).first()
+    user = load_user(db, user_id)
     if user is None:
         raise credentials_exception
     
@@ -132,25 +222,12 @@ async def get_current_user_optional(
 ) -> Optional[User]:
     """Get current user if authenticated, None otherwise"""
     try:
-        # Extract token from HttpOnly cookie only
-        token = extract_token_from_request(request)
-        if token is None:
-            return None
-        
-        payload = verify_token(token)
-        if payload is None:
-            return None
-        
-        user_id_str: str = payload.get("sub")
-        if user_id_str is None:
-            return None
-        
-        try:
-            user_id = int(user_id_str)
-        except (ValueError, TypeError):
+        # Token from HttpOnly cookie only
+        user_id = resolve_token_user_id(request)
+        if user_id is None:
             return None
         
-        user = db.query(User).filter(User.id == user_id).first()
+        user = load_user(db, user_id)
         if user is None or not user.is_active:
             return None
         
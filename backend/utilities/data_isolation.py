@@ -2,9 +2,18 @@
 Data isolation utilities for role-based access control
 """
 from typing import Any, Optional, List
-from sqlalchemy.orm import Session, Query
-from sqlalchemy import and_, or_
-from database.models import User, Cohort, Scenario, UserProgress, CohortStudent
+from sqlalchemy.orm import Session, Query, aliased
+from sqlalchemy import and_, or_, exists
+from database.models import User, Cohort, Scenario, UserProgress, CohortStudent, CohortSimulation
+
+# Fields never shown to non-admin users
+_SENSITIVE_USER_FIELDS = frozenset({'password_hash', 'google_id', 'provider'})
+
+# Basic profile fields students may see about other users
+_STUDENT_VISIBLE_USER_FIELDS = frozenset({
+    'id', 'user_id', 'full_name', 'username', 'bio', 'avatar_url',
+    'role', 'profile_public', 'created_at'
+})
 
 def filter_by_role(db_query: Query, current_user: User, target_role: Optional[str] = None) -> Query:
     """
@@ -22,37 +31,29 @@ def filter_by_role(db_query: Query, current_user: User, target_role: Optional[st
     if current_user.role == 'admin':
         return db_query
     
+    # Resolve the queried entity once; column_descriptions is rebuilt on every access
+    entity = db_query.column_descriptions[0]['entity']
+    
     # Role-based filtering
     if current_user.role == 'professor':
         # Professors can see their own data and student data within their cohorts
-        if hasattr(db_query.column_descriptions[0]['entity'], 'created_by'):
+        if hasattr(entity, 'created_by'):
             # Filter by ownership
-            db_query = db_query.filter(
-                or_(
-                    db_query.column_descriptions[0]['entity'].created_by == current_user.id,
-                    current_user.role == 'admin'
-                )
-            )
+            db_query = db_query.filter(entity.created_by == current_user.id)
     
     elif current_user.role == 'student':
         # Students can only see their own data and public data
-        if hasattr(db_query.column_descriptions[0]['entity'], 'user_id'):
+        if hasattr(entity, 'user_id'):
             # Filter by user ownership
-            db_query = db_query.filter(
-                db_query.column_descriptions[0]['entity'].user_id == current_user.id
-            )
-        elif hasattr(db_query.column_descriptions[0]['entity'], 'student_id'):
+            db_query = db_query.filter(entity.user_id == current_user.id)
+        elif hasattr(entity, 'student_id'):
             # Filter by student ownership
-            db_query = db_query.filter(
-                db_query.column_descriptions[0]['entity'].student_id == current_user.id
-            )
+            db_query = db_query.filter(entity.student_id == current_user.id)
     
     # Additional target role filtering
     if target_role and target_role != current_user.role:
-        if hasattr(db_query.column_descriptions[0]['entity'], 'role'):
-            db_query = db_query.filter(
-                db_query.column_descriptions[0]['entity'].role == target_role
-            )
+        if hasattr(entity, 'role'):
+            db_query = db_query.filter(entity.role == target_role)
     
     return db_query
 
@@ -88,6 +89,36 @@ def validate_data_access(user: User, resource_owner_id: int, allowed_roles: Opti
     
     return False
 
+def _student_cohorts(query: Query, user: User) -> Query:
+    """Students see cohorts they're enrolled in"""
+    return query.filter(exists().where(
+        CohortStudent.cohort_id == Cohort.id,
+        CohortStudent.student_id == user.id,
+        CohortStudent.status == 'approved'
+    ))
+
+# data_type -> (model, {role: filter}); roles without an entry (admins, and professors
+# for progress until cohort membership checks exist) get the unfiltered query
+_ROLE_SPECIFIC_DATA = {
+    'scenarios': (Scenario, {
+        # Professors see their own scenarios and public scenarios
+        'professor': lambda query, user: query.filter(
+            or_(Scenario.created_by == user.id, Scenario.is_public == True)
+        ),
+        # Students see public scenarios
+        'student': lambda query, user: query.filter(Scenario.is_public == True),
+    }),
+    'cohorts': (Cohort, {
+        # Professors see cohorts they created
+        'professor': lambda query, user: query.filter(Cohort.created_by == user.id),
+        'student': _student_cohorts,
+    }),
+    'progress': (UserProgress, {
+        # Students see their own progress
+        'student': lambda query, user: query.filter(UserProgress.user_id == user.id),
+    }),
+}
+
 def get_role_specific_data(user: User, data_type: str, db: Session) -> Query:
     """
     Get data specific to the user's role with proper isolation
@@ -100,49 +131,15 @@ def get_role_specific_data(user: User, data_type: str, db: Session) -> Query:
     Returns:
         Filtered query based on user role
     """
-    if data_type == 'scenarios':
-        query = db.query(Scenario)
-        if user.role == 'professor':
-            # Professors see their own scenarios and public scenarios
-            query = query.filter(
-                or_(
-                    Scenario.created_by == user.id,
-                    Scenario.is_public == True
-                )
-            )
-        elif user.role == 'student':
-            # Students see public scenarios and scenarios assigned to their cohorts
-            query = query.filter(Scenario.is_public == True)
-        return query
-    
-    elif data_type == 'cohorts':
-        query = db.query(Cohort)
-        if user.role == 'professor':
-            # Professors see cohorts they created
-            query = query.filter(Cohort.created_by == user.id)
-        elif user.role == 'student':
-            # Students see cohorts they're enrolled in
-            cohort_ids = db.query(CohortStudent.cohort_id).filter(
-                CohortStudent.student_id == user.id,
-                CohortStudent.status == 'approved'
-            ).subquery()
-            query = query.filter(Cohort.id.in_(cohort_ids))
-        return query
-    
-    elif data_type == 'progress':
-        query = db.query(UserProgress)
-        if user.role == 'student':
-            # Students see their own progress
-            query = query.filter(UserProgress.user_id == user.id)
-        elif user.role == 'professor':
-            # Professors see progress of students in their cohorts
-            # This would need cohort membership checks
-            pass
-        return query
-    
-    else:
+    entry = _ROLE_SPECIFIC_DATA.get(data_type)
+    if entry is None:
         # Default to empty query for unknown data types
         return db.query(User).filter(False)
+    
+    model, role_filters = entry
+    query = db.query(model)
+    role_filter = role_filters.get(user.role)
+    return role_filter(query, user) if role_filter else query
 
 def filter_cohort_access(user: User, cohort_id: int, db: Session) -> bool:
     """
@@ -159,20 +156,23 @@ def filter_cohort_access(user: User, cohort_id: int, db: Session) -> bool:
     if user.role == 'admin':
         return True
     
-    cohort = db.query(Cohort).filter(Cohort.id == cohort_id).first()
-    if not cohort:
+    # Owner and the user's approved enrollment, fetched together in one row
+    row = db.query(
+        Cohort.created_by,
+        exists().where(
+            CohortStudent.cohort_id == cohort_id,
+            CohortStudent.student_id == user.id,
+            CohortStudent.status == 'approved'
+        ).label('enrolled')
+    ).filter(Cohort.id == cohort_id).first()
+    if not row:
         return False
     
-    if user.role == 'professor' and cohort.created_by == user.id:
+    if user.role == 'professor' and row.created_by == user.id:
         return True
     
     if user.role == 'student':
-        enrollment = db.query(CohortStudent).filter(
-            CohortStudent.cohort_id == cohort_id,
-            CohortStudent.student_id == user.id,
-            CohortStudent.status == 'approved'
-        ).first()
-        return enrollment is not None
+        return bool(row.enrolled)
     
     return False
 
@@ -191,32 +191,27 @@ def filter_scenario_access(user: User, scenario_id: int, db: Session) -> bool:
     if user.role == 'admin':
         return True
     
-    scenario = db.query(Scenario).filter(Scenario.id == scenario_id).first()
-    if not scenario:
-        return False
-    
-    if user.role == 'professor' and scenario.created_by == user.id:
-        return True
+    # Every rule the user's role allows, checked against the scenario in one query
+    access_rules = [Scenario.is_public == True]
     
-    if scenario.is_public:
-        return True
+    if user.role == 'professor':
+        access_rules.append(Scenario.created_by == user.id)
     
     if user.role == 'student':
-        # Check if scenario is assigned to user's cohorts
-        cohort_ids = db.query(CohortStudent.cohort_id).filter(
+        # Scenario is assigned to one of the user's approved cohorts
+        access_rules.append(exists().where(
+            CohortSimulation.simulation_id == Scenario.id,
+            CohortSimulation.cohort_id == CohortStudent.cohort_id,
             CohortStudent.student_id == user.id,
             CohortStudent.status == 'approved'
-        ).subquery()
-        
-        from database.models import CohortSimulation
-        assigned_scenario = db.query(CohortSimulation).filter(
-            CohortSimulation.simulation_id == scenario_id,
-            CohortSimulation.cohort_id.in_(cohort_ids)
-        ).first()
-        
-        return assigned_scenario is not None
+        ))
     
-    return False
+    accessible = db.query(Scenario.id).filter(
+        Scenario.id == scenario_id,
+        or_(*access_rules)
+    ).first()
+    
+    return accessible is not None
 
 def get_accessible_users(user: User, db: Session) -> Query:
     """
@@ -235,38 +230,46 @@ def get_accessible_users(user: User, db: Session) -> Query:
         return query
     
     if user.role == 'professor':
-        # Professors can see students in their cohorts
-        cohort_ids = db.query(Cohort.id).filter(Cohort.created_by == user.id).subquery()
-        student_ids = db.query(CohortStudent.student_id).filter(
-            CohortStudent.cohort_id.in_(cohort_ids),
-            CohortStudent.status == 'approved'
-        ).subquery()
+        # Professors can see students in their cohorts: one correlated EXISTS
+        # over the enrollment/cohort join instead of nested IN subqueries
+        in_my_cohort = exists().where(
+            CohortStudent.student_id == User.id,
+            CohortStudent.status == 'approved',
+            Cohort.id == CohortStudent.cohort_id,
+            Cohort.created_by == user.id
+        )
         
         query = query.filter(
             or_(
                 User.id == user.id,  # Self
-                User.id.in_(student_ids)  # Students in their cohorts
+                in_my_cohort  # Students in their cohorts
             )
         )
     
     elif user.role == 'student':
         # Students can see professors of their cohorts and other students in same cohorts
-        cohort_ids = db.query(CohortStudent.cohort_id).filter(
-            CohortStudent.student_id == user.id,
-            CohortStudent.status == 'approved'
-        ).subquery()
+        mine = aliased(CohortStudent)
+        peer = aliased(CohortStudent)
         
-        professor_ids = db.query(Cohort.created_by).filter(Cohort.id.in_(cohort_ids)).subquery()
-        student_ids = db.query(CohortStudent.student_id).filter(
-            CohortStudent.cohort_id.in_(cohort_ids),
-            CohortStudent.status == 'approved'
-        ).subquery()
+        teaches_me = exists().where(
+            Cohort.created_by == User.id,
+            Cohort.id == mine.cohort_id,
+            mine.student_id == user.id,
+            mine.status == 'approved'
+        )
+        classmate = exists().where(
+            peer.student_id == User.id,
+            peer.status == 'approved',
+            peer.cohort_id == mine.cohort_id,
+            mine.student_id == user.id,
+            mine.status == 'approved'
+        )
         
         query = query.filter(
             or_(
                 User.id == user.id,  # Self
-                User.id.in_(professor_ids),  # Professors of their cohorts
-                User.id.in_(student_ids)  # Other students in same cohorts
+                teaches_me,  # Professors of their cohorts
+                classmate  # Other students in same cohorts
             )
         )
     
@@ -287,25 +290,9 @@ def sanitize_user_data(user_data: dict, requesting_user: User) -> dict:
     if requesting_user.role == 'admin':
         return user_data
     
-    # Remove sensitive fields for non-admin users
-    sensitive_fields = ['password_hash', 'google_id', 'provider']
-    for field in sensitive_fields:
-        user_data.pop(field, None)
-    
-    # Students can only see limited professor data
+    # Students can only see limited profile information
     if requesting_user.role == 'student':
-        # Only show basic profile information
-        allowed_fields = [
-            'id', 'user_id', 'full_name', 'username', 'bio', 'avatar_url',
-            'role', 'profile_public', 'created_at'
-        ]
-        return {k: v for k, v in user_data.items() if k in allowed_fields}
-    
-    # Professors can see more student data (for their cohorts)
-    if requesting_user.role == 'professor':
-        # Remove some sensitive fields but allow more than students
-        restricted_fields = ['password_hash']
-        for field in restricted_fields:
-            user_data.pop(field, None)
-    
-    return user_data
+        return {k: v for k, v in user_data.items() if k in _STUDENT_VISIBLE_USER_FIELDS}
+    
+    # Everyone else (including professors, for their cohorts) sees all but the sensitive fields
+    return {k: v for k, v in user_data.items() if k not in _SENSITIVE_USER_FIELDS}
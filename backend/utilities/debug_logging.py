@@ -1,6 +1,12 @@
 """
 Debug logging utility with environment-based controls
 Only logs in development mode to prevent sensitive information exposure in production
+
+Outside development both helpers are bound to no-ops at import, so a call costs only
+the call itself. Arguments are still evaluated by the caller, so hot paths should pass
+values separately instead of pre-formatting an f-string:
+    debug_log("Loaded scenario", scenario_id)          # print-style, joined with spaces
+    debug_logger("Loaded scenario %s", scenario_id)    # logging-style %-formatting
 """
 import os
 import logging
@@ -8,16 +14,24 @@ import logging
 # Get logger
 logger = logging.getLogger(__name__)
 
+# Resolved once at import; main.py loads .env before importing this module
+_IS_DEV = os.getenv('ENVIRONMENT', 'development').lower() in {'development', 'dev', 'local'}
+
 def is_development() -> bool:
     """Check if we're in development mode"""
-    return os.getenv('ENVIRONMENT', 'development').lower() in ['development', 'dev', 'local']
+    return _IS_DEV
 
-def debug_log(message: str, *args, **kwargs):
-    """Debug log that only outputs in development mode"""
-    if is_development():
+if _IS_DEV:
+    def debug_log(message: str, *args, **kwargs):
+        """Debug log that only outputs in development mode"""
         print(f"[DEBUG] {message}", *args, **kwargs)
 
-def debug_logger(message: str, *args, **kwargs):
-    """Debug logger that only outputs in development mode"""
-    if is_development():
+    def debug_logger(message: str, *args, **kwargs):
+        """Debug logger that only outputs in development mode"""
         logger.debug(f"[DEBUG] {message}", *args, **kwargs)
+else:
+    def debug_log(message: str, *args, **kwargs):
+        """Debug log that only outputs in development mode (no-op here)"""
+
+    def debug_logger(message: str, *args, **kwargs):
+        """Debug logger that only outputs in development mode (no-op here)"""
@@ -1,12 +1,40 @@
 """
 User ID generation utilities for role-based system
 """
+import base64
+import logging
+import os
+import re
 import secrets
 import string
-from typing import Literal
+from typing import List, Literal
 from sqlalchemy.orm import Session
 from database.models import User
 
+logger = logging.getLogger(__name__)
+
+# Candidate IDs checked per database round trip in generate_unique_user_id
+USER_ID_BATCH_SIZE = 16
+
+USER_ID_PREFIXES = {'student': 'STUD-', 'professor': 'INSTR-'}
+_VALID_ROLES = frozenset(USER_ID_PREFIXES)
+USER_ID_RANDOM_LENGTH = 9
+_USER_ID_ALPHABET = (string.ascii_uppercase + string.digits).encode()
+_USER_ID_RE = re.compile(r'(STUD|INSTR)-[A-Z0-9]{%d}' % USER_ID_RANDOM_LENGTH)
+_ROLE_BY_PREFIX = {prefix: role for role, prefix in USER_ID_PREFIXES.items()}
+
+def _random_user_id_part() -> str:
+    """Draw the random part of a user ID from one CSPRNG read per attempt"""
+    chars = bytearray()
+    while len(chars) < USER_ID_RANDOM_LENGTH:
+        # 6-bit values below 36 map uniformly onto the alphabet; the rest are rejected,
+        # and 32 bytes give ~18 accepted values, so one read almost always suffices
+        for b in secrets.token_bytes(32):
+            b &= 0x3F
+            if b < 36:
+                chars.append(_USER_ID_ALPHABET[b])
+    return chars[:USER_ID_RANDOM_LENGTH].decode()
+
 def generate_user_id(role: str) -> str:
     """
     Generate a role-based user ID
@@ -20,16 +48,12 @@ def generate_user_id(role: str) -> str:
     Raises:
         ValueError: If role is not 'student' or 'professor'
     """
-    if role not in ['student', 'professor']:
+    prefix = USER_ID_PREFIXES.get(role)
+    if prefix is None:
         raise ValueError(f"Invalid role: {role}. Must be 'student' or 'professor'")
     
-    # Generate 9 alphanumeric characters
-    random_part = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(9))
-    
-    if role == 'student':
-        return f"STUD-{random_part}"
-    else:  # professor
-        return f"INSTR-{random_part}"
+    # 9 alphanumeric characters
+    return prefix + _random_user_id_part()
 
 def generate_unique_user_id(db: Session, role: str) -> str:
     """
@@ -45,26 +69,25 @@ def generate_unique_user_id(db: Session, role: str) -> str:
     Raises:
         ValueError: If role is invalid
     """
-    print(f"🔄 Generating unique user ID for role: {role}")
-    max_attempts = 100  # Prevent infinite loops
-    attempts = 0
+    logger.debug("Generating unique user ID for role: %s", role)
+    max_batches = 4  # Prevent infinite loops
     
-    while attempts < max_attempts:
-        user_id = generate_user_id(role)
-        print(f"🎲 Generated ID attempt {attempts + 1}: {user_id}")
-        
-        # Check if ID already exists
-        existing_user = db.query(User).filter(User.user_id == user_id).first()
-        if not existing_user:
-            print(f"✅ Unique ID found: {user_id}")
-            return user_id
-        
-        print(f"⚠️ ID {user_id} already exists, trying again...")
-        attempts += 1
+    for _ in range(max_batches):
+        # Check a batch of candidates in one query; a collision is already vanishingly rare
+        candidates = [generate_user_id(role) for _ in range(USER_ID_BATCH_SIZE)]
+        taken = {
+            row[0] for row in
+            db.query(User.user_id).filter(User.user_id.in_(candidates)).all()
+        }
+        for user_id in candidates:
+            if user_id not in taken:
+                logger.debug("Unique ID found: %s", user_id)
+                return user_id
     
     # If we couldn't generate a unique ID after max attempts, raise error
-    print(f"❌ Failed to generate unique user ID for role '{role}' after {max_attempts} attempts")
-    raise RuntimeError(f"Failed to generate unique user ID for role '{role}' after {max_attempts} attempts")
+    attempts = max_batches * USER_ID_BATCH_SIZE
+    logger.error("Failed to generate unique user ID for role '%s' after %d attempts", role, attempts)
+    raise RuntimeError(f"Failed to generate unique user ID for role '{role}' after {attempts} attempts")
 
 def validate_user_role(role: str) -> bool:
     """
@@ -76,7 +99,7 @@ def validate_user_role(role: str) -> bool:
     Returns:
         True if valid, False otherwise
     """
-    return role in ['student', 'professor']
+    return role in _VALID_ROLES
 
 def extract_role_from_user_id(user_id: str) -> str | None:
     """
@@ -91,12 +114,11 @@ def extract_role_from_user_id(user_id: str) -> str | None:
     if not user_id or not isinstance(user_id, str):
         return None
     
-    if user_id.startswith('STUD-') and len(user_id) == 14:  # STUD- + 9 chars
-        return 'student'
-    elif user_id.startswith('INSTR-') and len(user_id) == 15:  # INSTR- + 9 chars
-        return 'professor'
-    
-    return None
+    # Prefix plus 9 uppercase alphanumeric characters, checked in one match
+    match = _USER_ID_RE.fullmatch(user_id)
+    if match is None:
+        return None
+    return _ROLE_BY_PREFIX[match.group(1) + '-']
 
 def is_valid_user_id_format(user_id: str) -> bool:
     """
@@ -119,6 +141,22 @@ def generate_invitation_token() -> str:
     """
     return secrets.token_urlsafe(32)
 
+def generate_invitation_tokens(count: int) -> List[str]:
+    """
+    Generate several invitation tokens from a single CSPRNG read
+    
+    Args:
+        count: Number of tokens to generate
+        
+    Returns:
+        URL-safe token strings in the same format as generate_invitation_token
+    """
+    raw = os.urandom(32 * count)
+    return [
+        base64.urlsafe_b64encode(raw[i:i + 32]).rstrip(b'=').decode('ascii')
+        for i in range(0, len(raw), 32)
+    ]
+
 def generate_email_verification_token() -> str:
     """
     Generate a secure email verification token
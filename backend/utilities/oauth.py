@@ -2,16 +2,23 @@
 OAuth utilities for Google authentication using google-auth-oauthlib
 """
 import logging
-from typing import Optional, Dict, Any
-from database.connection import settings
-from database.models import User
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from urllib.parse import quote, urlencode
+from typing import Optional, Dict, Any, Tuple
+from database.connection import engine, settings
+from database.models import User, email_base_expression
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from utilities.auth import create_access_token
+from utilities.auth import create_access_token, invalidate_cached_user
 import secrets
 import hmac
 from google.auth.transport import requests
+from requests.adapters import HTTPAdapter
 from google.oauth2 import id_token
-from google_auth_oauthlib.flow import Flow
 from fastapi import HTTPException, status
 
 # Set up logger
@@ -21,6 +28,71 @@ logger = logging.getLogger(__name__)
 GOOGLE_CLIENT_ID = settings.google_client_id
 GOOGLE_CLIENT_SECRET = settings.google_client_secret
 GOOGLE_REDIRECT_URI = settings.google_redirect_uri
+GOOGLE_AUTH_URI = "https://accounts.google.com/o/oauth2/v2/auth"
+GOOGLE_SCOPES = ["openid", "https://www.googleapis.com/auth/userinfo.email", "https://www.googleapis.com/auth/userinfo.profile"]
+
+# Everything in the authorization URL except the per-request state; matches what
+# Flow.authorization_url builds for this configuration (no PKCE challenge)
+_STATIC_AUTH_QUERY = urlencode({
+    "response_type": "code",
+    "client_id": GOOGLE_CLIENT_ID or "",
+    "redirect_uri": GOOGLE_REDIRECT_URI or "",
+    "scope": " ".join(GOOGLE_SCOPES),
+    "access_type": "offline",
+    "prompt": "select_account",
+})
+
+# One keep-alive connection pool for every call to Google (token exchange and ID token
+# certificate fetches), instead of a fresh TCP+TLS handshake per login
+_GOOGLE_HTTP_ADAPTER = HTTPAdapter(pool_connections=4, pool_maxsize=20)
+_google_transport = requests.Request()
+_google_transport.session.mount("https://", _GOOGLE_HTTP_ADAPTER)
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+class _CertCachingRequest:
+    """Transport wrapper that keeps Google's signing certificates for their Cache-Control
+    max-age; google-auth itself downloads them again on every ID token verification"""
+    
+    def __init__(self, request):
+        self._request = request
+        self._cache: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+    
+    def __call__(self, url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        if method != "GET" or body is not None:
+            return self._request(url, method=method, body=body, headers=headers, timeout=timeout, **kwargs)
+        
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(url)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        
+        response = self._request(url, method=method, headers=headers, timeout=timeout, **kwargs)
+        max_age = _MAX_AGE_RE.search(response.headers.get("cache-control", "")) if response.status == 200 else None
+        if max_age:
+            with self._lock:
+                self._cache[url] = (now + int(max_age.group(1)), response)
+        return response
+
+_google_request = _CertCachingRequest(_google_transport)
+
+# Validated claims of recently verified ID tokens, kept until the token's exp claim
+ID_TOKEN_CACHE_SIZE = 2048
+_id_token_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_id_token_cache_lock = threading.Lock()
+
+# Resolved once: which alias-email query this database supports
+_DIALECT_NAME = engine.dialect.name
+_REGEXP_DIALECTS = frozenset({'mysql', 'mariadb', 'sqlite'})
+
+# Primary keys of recently looked-up OAuth users, keyed on (column, value). Hits are
+# re-read by primary key and re-checked against the value, so a stale entry costs a miss
+OAUTH_LOOKUP_CACHE_TTL_SECONDS = 30
+OAUTH_LOOKUP_CACHE_SIZE = 1024
+_oauth_lookup_cache: "OrderedDict[Tuple[str, str], Tuple[float, int]]" = OrderedDict()
+_oauth_lookup_cache_lock = threading.Lock()
 
 def generate_state() -> str:
     """Generate a random state parameter for OAuth security"""
@@ -28,36 +100,19 @@ def generate_state() -> str:
 
 def verify_state(state: str, stored_state: str) -> bool:
     """Verify the OAuth state parameter"""
-    return hmac.compare_digest(state or "", stored_state or "")
+    # Compare bytes: compare_digest rejects non-ASCII str. A length mismatch only reveals
+    # the length, which is fixed for token_urlsafe(32) states anyway
+    state_bytes = (state or "").encode()
+    stored_bytes = (stored_state or "").encode()
+    return len(state_bytes) == len(stored_bytes) and hmac.compare_digest(state_bytes, stored_bytes)
 
 def get_google_auth_url(state: str) -> str:
-    """Generate Google OAuth authorization URL using google-auth-oauthlib"""
+    """Generate Google OAuth authorization URL from the precomputed static query"""
     # Validate required OAuth configuration
     if not GOOGLE_CLIENT_ID or not GOOGLE_REDIRECT_URI:
         raise ValueError("Google OAuth is not configured. Missing GOOGLE_CLIENT_ID or GOOGLE_REDIRECT_URI")
     
-    # Create OAuth flow using Google's library
-    client_config = {
-        "web": {
-            "client_id": GOOGLE_CLIENT_ID,
-            "client_secret": GOOGLE_CLIENT_SECRET,
-            "auth_uri": "https://accounts.google.com/o/oauth2/v2/auth",
-            "token_uri": "https://oauth2.googleapis.com/token",
-            "redirect_uris": [GOOGLE_REDIRECT_URI]
-        }
-    }
-    
-    flow = Flow.from_client_config(
-        client_config,
-        scopes=["openid", "https://www.googleapis.com/auth/userinfo.email", "https://www.googleapis.com/auth/userinfo.profile"],
-        state=state
-    )
-    flow.redirect_uri = GOOGLE_REDIRECT_URI
-    
-    return flow.authorization_url(
-        access_type="offline",
-        prompt="select_account"
-    )[0]
+    return f"{GOOGLE_AUTH_URI}?{_STATIC_AUTH_QUERY}&state={quote(state, safe='')}"
 
 def exchange_code_for_token(code: str, state: str) -> Optional[Dict[str, Any]]:
     """Exchange authorization code for access token and id_token using google-auth-oauthlib"""
@@ -73,12 +128,15 @@ def exchange_code_for_token(code: str, state: str) -> Optional[Dict[str, Any]]:
         return None
     
     try:
+        # Deferred: oauthlib/requests-oauthlib are only needed once a callback arrives
+        from google_auth_oauthlib.flow import Flow
+        
         # Create OAuth flow using Google's library
         client_config = {
             "web": {
                 "client_id": GOOGLE_CLIENT_ID,
                 "client_secret": GOOGLE_CLIENT_SECRET,
-                "auth_uri": "https://accounts.google.com/o/oauth2/v2/auth",
+                "auth_uri": GOOGLE_AUTH_URI,
                 "token_uri": "https://oauth2.googleapis.com/token",
                 "redirect_uris": [GOOGLE_REDIRECT_URI]
             }
@@ -86,10 +144,11 @@ def exchange_code_for_token(code: str, state: str) -> Optional[Dict[str, Any]]:
         
         flow = Flow.from_client_config(
             client_config,
-            scopes=["openid", "https://www.googleapis.com/auth/userinfo.email", "https://www.googleapis.com/auth/userinfo.profile"],
+            scopes=GOOGLE_SCOPES,
             state=state
         )
         flow.redirect_uri = GOOGLE_REDIRECT_URI
+        flow.oauth2session.mount("https://", _GOOGLE_HTTP_ADAPTER)
         
         # Exchange the authorization code for tokens
         flow.fetch_token(code=code)
@@ -123,11 +182,19 @@ def verify_google_id_token(id_token_str: str) -> Dict[str, Any]:
     Raises:
         HTTPException: If token verification fails
     """
+    with _id_token_cache_lock:
+        entry = _id_token_cache.get(id_token_str)
+        if entry is not None:
+            if entry[0] > time.time():
+                _id_token_cache.move_to_end(id_token_str)
+                return dict(entry[1])
+            del _id_token_cache[id_token_str]
+    
     try:
         # Verify the ID token
         idinfo = id_token.verify_oauth2_token(
             id_token_str, 
-            requests.Request(), 
+            _google_request, 
             GOOGLE_CLIENT_ID
         )
         
@@ -153,7 +220,7 @@ def verify_google_id_token(id_token_str: str) -> Dict[str, Any]:
             )
         
         # Return validated claims
-        return {
+        claims = {
             "email": idinfo.get("email"),
             "name": idinfo.get("name"),
             "picture": idinfo.get("picture"),
@@ -161,6 +228,12 @@ def verify_google_id_token(id_token_str: str) -> Dict[str, Any]:
             "id": idinfo.get("sub"),
             "email_verified": idinfo.get("email_verified", False)
         }
+        with _id_token_cache_lock:
+            _id_token_cache[id_token_str] = (idinfo['exp'], claims)
+            _id_token_cache.move_to_end(id_token_str)
+            while len(_id_token_cache) > ID_TOKEN_CACHE_SIZE:
+                _id_token_cache.popitem(last=False)
+        return dict(claims)
         
     except ValueError as e:
         raise HTTPException(
@@ -183,22 +256,50 @@ def get_google_user_info_from_id_token(id_token_str: str) -> Optional[Dict[str,
         logger.error(f"Error getting user info from ID token: {e}")
         return None
 
+def _find_user_cached(db: Session, column, value: str) -> Optional[User]:
+    """Look up a user by a unique column, remembering the primary key of the match"""
+    key = (column.key, value)
+    now = time.monotonic()
+    with _oauth_lookup_cache_lock:
+        entry = _oauth_lookup_cache.get(key)
+        if entry is not None and entry[0] <= now:
+            del _oauth_lookup_cache[key]
+            entry = None
+    
+    if entry is not None:
+        # Primary-key get: no SQL at all if this session already holds the user
+        user = db.get(User, entry[1])
+        if user is not None and getattr(user, column.key) == value:
+            return user
+    
+    user = db.scalar(select(User).where(column == value).limit(1))
+    with _oauth_lookup_cache_lock:
+        if user is None:
+            _oauth_lookup_cache.pop(key, None)
+        else:
+            _oauth_lookup_cache[key] = (now + OAUTH_LOOKUP_CACHE_TTL_SECONDS, user.id)
+            _oauth_lookup_cache.move_to_end(key)
+            while len(_oauth_lookup_cache) > OAUTH_LOOKUP_CACHE_SIZE:
+                _oauth_lookup_cache.popitem(last=False)
+    return user
+
+def _forget_oauth_lookups(*keys: Tuple[str, Optional[str]]) -> None:
+    """Drop cached lookups for values that no longer identify the same user"""
+    with _oauth_lookup_cache_lock:
+        for key in keys:
+            _oauth_lookup_cache.pop(key, None)
+
 def find_existing_user_by_email(db: Session, email: str) -> Optional[User]:
     """Find existing user by email"""
-    return db.query(User).filter(User.email == email).first()
+    return _find_user_cached(db, User.email, email)
 
 def find_existing_user_by_google_id(db: Session, google_id: str) -> Optional[User]:
     """Find existing user by Google ID"""
-    return db.query(User).filter(User.google_id == google_id).first()
+    return _find_user_cached(db, User.google_id, google_id)
 
-def find_oauth_user_by_original_email(db: Session, original_email: str) -> Optional[User]:
-    """Find OAuth user by their original email (before +google suffix)"""
-    # First try exact match
-    user = db.query(User).filter(User.email == original_email).first()
-    if user:
-        return user
-    
-    # If not found, try to find OAuth user with modified email
+@lru_cache(maxsize=1024)
+def _alias_email_patterns(original_email: str) -> Optional[Tuple[str, str]]:
+    """Regex and LIKE patterns matching the +googleN aliases of an email, or None if malformed"""
     # Split email robustly with rsplit to handle multiple @ symbols
     email_parts = original_email.rsplit('@', 1)
     if len(email_parts) != 2:
@@ -206,71 +307,67 @@ def find_oauth_user_by_original_email(db: Session, original_email: str) -> Optio
     
     base_email, domain = email_parts
     
-    # Escape special regex characters in base_email and domain
-    import re
-    escaped_base = re.escape(base_email)
-    escaped_domain = re.escape(domain)
+    # Precise regex pattern: base_email+google followed by one or more digits
+    pattern = f"^{re.escape(base_email)}\\+google\\d+@{re.escape(domain)}$"
+    return pattern, f"{base_email}+google%@{domain}"
+
+def find_oauth_user_by_original_email(db: Session, original_email: str) -> Optional[User]:
+    """Find OAuth user by their original email (before +google suffix)"""
+    # First try exact match
+    user = db.scalar(select(User).where(User.email == original_email).limit(1))
+    if user:
+        return user
     
-    # Create precise regex pattern: base_email+google followed by one or more digits
-    pattern = f"^{escaped_base}\\+google\\d+@{escaped_domain}$"
+    if _DIALECT_NAME == 'postgresql':
+        # Equality on the indexed expression (idx_users_email_base) instead of a regex scan
+        return db.scalar(select(User).where(
+            email_base_expression(User.email) == original_email,
+            User.provider == "google"
+        ).limit(1))
     
-    # Use dialect-aware regex matching
-    from sqlalchemy import text
-    from database.connection import engine
+    # If not found, try to find OAuth user with modified email
+    patterns = _alias_email_patterns(original_email)
+    if patterns is None:
+        return None
+    pattern, like_pattern = patterns
     
-    # Detect database dialect and use appropriate regex operator
-    dialect_name = engine.dialect.name
-    if dialect_name == 'postgresql':
-        # PostgreSQL uses ~ operator
-        return db.query(User).filter(
-            User.email.op('~')(pattern),
-            User.provider == "google"
-        ).first()
-    elif dialect_name in ['mysql', 'mariadb']:
-        # MySQL uses REGEXP operator
-        return db.query(User).filter(
-            User.email.op('REGEXP')(pattern),
-            User.provider == "google"
-        ).first()
-    elif dialect_name == 'sqlite':
-        # SQLite uses REGEXP operator (if extension is loaded) or fallback to LIKE
+    if _DIALECT_NAME in _REGEXP_DIALECTS:
         try:
-            return db.query(User).filter(
+            return db.scalar(select(User).where(
                 User.email.op('REGEXP')(pattern),
                 User.provider == "google"
-            ).first()
+            ).limit(1))
         except Exception:
-            # Fallback to LIKE-based pattern matching for SQLite
-            like_pattern = f"{base_email}+google%@{domain}"
-            return db.query(User).filter(
-                User.email.like(like_pattern),
-                User.provider == "google"
-            ).first()
-    else:
-        # Fallback to LIKE-based pattern matching for unsupported dialects
-        like_pattern = f"{base_email}+google%@{domain}"
-        return db.query(User).filter(
-            User.email.like(like_pattern),
-            User.provider == "google"
-        ).first()
+            # SQLite only has REGEXP when an extension provides it
+            if _DIALECT_NAME != 'sqlite':
+                raise
+    
+    # LIKE-based pattern matching for SQLite without REGEXP and unsupported dialects
+    return db.scalar(select(User).where(
+        User.email.like(like_pattern),
+        User.provider == "google"
+    ).limit(1))
+
+def _commit_keeping_state(db: Session) -> None:
+    """Commit without expiring loaded objects, so the caller can use them without a re-SELECT.
+    
+    Their values were written by this session, and User's eager_defaults fetches server
+    defaults (created_at, updated_at) during the flush.
+    """
+    expire_on_commit = db.expire_on_commit
+    db.expire_on_commit = False
+    try:
+        db.commit()
+    finally:
+        db.expire_on_commit = expire_on_commit
 
 def create_oauth_user(db: Session, google_data: Dict[str, Any], force_create: bool = False, role: str = "student") -> User:
     """Create a new user from Google OAuth data with role-based ID"""
     from utilities.id_generator import generate_unique_user_id
     
-    # Generate username from email
-    username = google_data["email"].split("@")[0]
-    
-    # Ensure username is unique
-    original_username = username
-    counter = 1
-    while db.query(User).filter(User.username == username).first():
-        username = f"{original_username}{counter}"
-        counter += 1
-    
     # Check if user already exists with this Google ID
     google_id_value = google_data.get("sub") or google_data.get("id")
-    existing_user = db.query(User).filter(User.google_id == google_id_value).first()
+    existing_user = db.scalar(select(User).where(User.google_id == google_id_value).limit(1))
     if existing_user:
         # User already exists, update their information and role
         existing_user.full_name = google_data.get("name", existing_user.full_name)
@@ -278,17 +375,29 @@ def create_oauth_user(db: Session, google_data: Dict[str, Any], force_create: bo
         existing_user.provider = "google"
         existing_user.is_verified = True
         existing_user.role = role  # Update the role with the selected role
-        db.commit()
-        db.refresh(existing_user)
+        _commit_keeping_state(db)
+        invalidate_cached_user(existing_user.id)
         return existing_user
     
     # Check if user exists with this email (only if not forcing creation)
     if not force_create:
-        existing_email_user = db.query(User).filter(User.email == google_data["email"]).first()
+        existing_email_user = db.scalar(select(User).where(User.email == google_data["email"]).limit(1))
         if existing_email_user:
             # Link the OAuth provider to the existing user
             return link_google_to_existing_user(db, existing_email_user, google_data)
     
+    # Generate username from email, made unique against all taken names sharing its prefix
+    original_username = google_data["email"].split("@")[0]
+    taken_usernames = {
+        name for (name,) in
+        db.query(User.username).filter(User.username.like(f"{original_username}%")).all()
+    }
+    username = original_username
+    counter = 1
+    while username in taken_usernames:
+        username = f"{original_username}{counter}"
+        counter += 1
+    
     # Create new user with original email (or modified email if forcing creation)
     user_email = google_data["email"]
     if force_create:
@@ -298,11 +407,20 @@ def create_oauth_user(db: Session, google_data: Dict[str, Any], force_create: bo
         # Add a suffix to make it unique
         user_email = f"{local_part}+google@{domain}"
         
-        # Ensure the modified email is also unique
-        counter = 1
-        while db.query(User).filter(User.email == user_email).first():
-            user_email = f"{local_part}+google{counter}@{domain}"
-            counter += 1
+        # Ensure the modified email is also unique: fetch every +google variant once
+        # and continue after the highest numeric suffix
+        prefix, suffix = f"{local_part}+google", f"@{domain}"
+        taken_emails = {
+            email for (email,) in
+            db.query(User.email).filter(User.email.like(f"{prefix}%{suffix}")).all()
+        }
+        if user_email in taken_emails:
+            counters = [
+                email[len(prefix):-len(suffix)] for email in taken_emails
+                if email.startswith(prefix) and email.endswith(suffix)
+            ]
+            counter = max((int(c) for c in counters if c.isdigit()), default=0) + 1
+            user_email = f"{prefix}{counter}{suffix}"
     
     # Generate role-based user ID
     try:
@@ -310,28 +428,48 @@ def create_oauth_user(db: Session, google_data: Dict[str, Any], force_create: bo
     except Exception as e:
         raise ValueError(f"Failed to generate user ID: {str(e)}")
     
-    user = User(
+    values = dict(
         user_id=user_id,
         email=user_email,
         full_name=google_data.get("name", ""),
         username=username,
         password_hash=None,  # OAuth users don't have passwords
         avatar_url=google_data.get("picture"),
-        google_id=google_data.get("sub") or google_data.get("id"),
+        google_id=google_id_value,
         provider="google",
         role=role,  # Set the role
         is_verified=True,  # Google accounts are considered verified
     )
     
-    print(f"DEBUG: Creating user with email: {user_email}, role: {role}, google_id: {user.google_id}")
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    print(f"DEBUG: User created successfully with ID: {user.id}")
+    logger.debug("Creating OAuth user with role %s", role)
+    if _DIALECT_NAME == 'postgresql':
+        # A concurrent callback for the same Google account may have inserted it since the
+        # lookup above; update that row like the existing-user branch instead of failing
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        stmt = pg_insert(User).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.google_id],
+            set_={
+                "full_name": stmt.excluded.full_name,
+                "avatar_url": stmt.excluded.avatar_url,
+                "provider": "google",
+                "is_verified": True,
+                "role": stmt.excluded.role,
+            },
+        ).returning(User)
+        user = db.scalars(stmt, execution_options={"populate_existing": True}).one()
+        _commit_keeping_state(db)
+        invalidate_cached_user(user.id)
+    else:
+        user = User(**values)
+        db.add(user)
+        _commit_keeping_state(db)
+    logger.debug("OAuth user created with ID %s", user.id)
     return user
 
 def link_google_to_existing_user(db: Session, user: User, google_data: Dict[str, Any]) -> User:
     """Link Google OAuth to existing user account"""
+    _forget_oauth_lookups(("google_id", user.google_id))
     user.google_id = google_data.get("sub") or google_data.get("id")
     user.provider = "google"  # Update provider to google
     
@@ -339,8 +477,8 @@ def link_google_to_existing_user(db: Session, user: User, google_data: Dict[str,
     if not user.avatar_url and google_data.get("picture"):
         user.avatar_url = google_data["picture"]
     
-    db.commit()
-    db.refresh(user)
+    _commit_keeping_state(db)
+    invalidate_cached_user(user.id)
     return user
 
 def create_oauth_access_token(user: User) -> str:
@@ -354,24 +492,6 @@ def create_user_login_response(user: User):
     return UserLoginResponse(
         access_token="",  # Empty token - authentication via HttpOnly cookie only
         token_type="cookie",
-        user=UserResponse(
-            id=user.id,
-            user_id=user.user_id,
-            email=user.email,
-            full_name=user.full_name,
-            username=user.username,
-            bio=user.bio,
-            avatar_url=user.avatar_url,
-            role=user.role,
-            published_scenarios=user.published_scenarios,
-            total_simulations=user.total_simulations,
-            reputation_score=user.reputation_score,
-            profile_public=user.profile_public,
-            allow_contact=user.allow_contact,
-            is_active=user.is_active,
-            is_verified=user.is_verified,
-            provider=user.provider,
-            created_at=user.created_at,
-            updated_at=user.updated_at
-        )
+        # from_attributes reads the same columns in pydantic-core instead of a Python kwargs build
+        user=UserResponse.model_validate(user)
     )
@@ -3,23 +3,122 @@ Redis Manager for AI Agent Education Platform
 Centralized Redis client with fallback mechanisms and caching utilities
 """
 
+import asyncio
+import copy
+import fnmatch
+import functools
+import inspect
 import json
 import hashlib
+import threading
 import time
 import logging
-from typing import Any, Dict, Optional, Union, List
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple, Union
 from datetime import datetime, timedelta
 import os
 from contextlib import asynccontextmanager
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
 # Logger for Redis operations
 logger = logging.getLogger(__name__)
 
+# Commands sent per pipeline round trip, keeping each reply buffer bounded
+PIPELINE_BATCH_SIZE = 1000
+# Keys examined per SCAN step; small counts (the server default is 10) multiply round trips
+SCAN_COUNT = 1000
+
+if BLAKE3_AVAILABLE:
+    def _key_digest(data: bytes) -> str:
+        """128-bit hex digest for cache keys (SIMD BLAKE3)"""
+        return blake3.blake3(data).hexdigest(length=16)
+else:
+    def _key_digest(data: bytes) -> str:
+        """128-bit hex digest for cache keys (BLAKE2b, faster than MD5 on 64-bit CPUs)"""
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+# Per-process L1 in front of Redis for CacheManager. Entries live at most this long (and never
+# past the key's Redis TTL), which bounds how stale a value can be after another worker
+# invalidates it. Off by default: invalidation only reaches the invalidating worker's L1
+CACHE_L1_TTL_SECONDS = int(os.getenv("CACHE_L1_TTL_SECONDS", "0"))
+CACHE_L1_SIZE = 4096
+
+# Upper bound on sockets per process; size to worker concurrency (threadpool + async tasks)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+
+# Connection pools shared by every RedisManager in the process, keyed by (url, protocol)
+_pools: Dict[tuple, Any] = {}
+_pool_lock = threading.Lock()
+
+def _get_pool(redis_url: str, protocol: int, **connection_options):
+    """Return the process-wide connection pool for a URL, creating it on first use"""
+    import redis
+    key = (redis_url, protocol)
+    with _pool_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = redis.ConnectionPool.from_url(
+                redis_url,
+                protocol=protocol,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                **connection_options
+            )
+            _pools[key] = pool
+    return pool
+
+if ORJSON_AVAILABLE:
+    def _json_dumps(value: Any) -> str:
+        """Serialize with orjson, falling back to json for types orjson rejects (e.g. >64-bit ints)"""
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            return json.dumps(value)
+    
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch either
+    _json_loads = orjson.loads
+else:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
+# How long is_available() trusts its last PING before sending another
+PING_CACHE_SECONDS = 1.0
+
+# Value types redis-py writes as-is; int/float are encoded exactly as str() would
+_NATIVE_VALUE_TYPES = frozenset((str, int, float))
+
+# Leading byte of MessagePack-encoded dict/list values. 0x80 is a UTF-8 continuation byte,
+# so it can never start the plain text values (str(value) or JSON) stored before or alongside
+_MSGPACK_TAG = b"\x80"
+# Leading byte of raw bytes values, another continuation byte. Without it a payload that
+# happens to start with 0x80 (e.g. any pickle) would be read back as MessagePack
+_BYTES_TAG = b"\x81"
+
 class RedisManager:
     """Centralized Redis client - Redis only, no fallbacks"""
     
     def __init__(self):
         self.redis_client = None
+        self._last_ping_ok = False
+        self._last_ping_ts = float("-inf")
+        # Failed operations by name, bumped on _call's error path
+        self.error_counts: Counter = Counter()
         self._init_redis()
     
     def _init_redis(self):
@@ -31,163 +130,330 @@ class RedisManager:
                 logger.error("REDIS_URL environment variable is required. Please set it in your .env file.")
                 raise ValueError("REDIS_URL is required but not properly configured")
             
-            self.redis_client = redis.from_url(
-                redis_url, 
-                decode_responses=True,
+            from redis.utils import HIREDIS_AVAILABLE
+            
+            # Values stay bytes so MessagePack frames survive; text values are decoded in get()
+            connection_options = dict(
+                decode_responses=False,
                 socket_connect_timeout=5,
                 socket_timeout=5,
                 retry_on_timeout=True,
                 health_check_interval=30
             )
-            # Test connection
-            self.redis_client.ping()
-            logger.info("Redis client initialized successfully")
+            try:
+                # RESP3 where the server supports it (Redis 6+): typed replies, less parsing
+                self.redis_client = redis.Redis(
+                    connection_pool=_get_pool(redis_url, 3, **connection_options)
+                )
+                # Test connection
+                self.redis_client.ping()
+                protocol = 3
+            except redis.exceptions.ResponseError:
+                # Older servers reject the HELLO handshake; stay on RESP2
+                self.redis_client = redis.Redis(
+                    connection_pool=_get_pool(redis_url, 2, **connection_options)
+                )
+                self.redis_client.ping()
+                protocol = 2
+            logger.info(
+                "Redis client initialized successfully (RESP%d, %s parser)",
+                protocol, "hiredis" if HIREDIS_AVAILABLE else "pure-Python"
+            )
         except Exception as e:
             logger.error(f"Failed to initialize Redis client: {e}")
             logger.error("Please ensure Redis is running and REDIS_URL is correctly configured in your .env file")
             raise RuntimeError(f"Redis initialization failed: {e}. Please check your Redis configuration.")
     
     def is_available(self) -> bool:
-        """Check if Redis is available"""
+        """Check if Redis is available (the PING result is reused for PING_CACHE_SECONDS)"""
         if not self.redis_client:
             return False
+        now = time.monotonic()
+        if now - self._last_ping_ts < PING_CACHE_SECONDS:
+            return self._last_ping_ok
         try:
             self.redis_client.ping()
-            return True
+            ok = True
         except Exception:
-            return False
+            ok = False
+        self._last_ping_ok = ok
+        self._last_ping_ts = now
+        return ok
+    
+    @staticmethod
+    def _serialize(value: Any) -> Union[bytes, str, int, float]:
+        """Encode a value for storage; other types stay plain text so INCR and the like keep working"""
+        # Types the client encodes natively go through untouched (bool is excluded: redis-py
+        # rejects it, and str() keeps the historical "True"/"False")
+        if type(value) in _NATIVE_VALUE_TYPES:
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return _BYTES_TAG + bytes(value)
+        if isinstance(value, (dict, list)):
+            try:
+                if not MSGPACK_AVAILABLE:
+                    raise TypeError("msgpack not installed")
+                return _MSGPACK_TAG + msgpack.packb(value, use_bin_type=True)
+            except (TypeError, OverflowError, ValueError):
+                # e.g. datetimes, which only the orjson path can encode, or ints beyond 64 bits
+                return _json_dumps(value)
+        return str(value)
+    
+    def _call(self, op_name: str, key: str, default: Any, fn) -> Any:
+        """Run one Redis operation, logging and returning `default` if it fails.
+        
+        The single error path for the per-key methods; failures are also counted per
+        operation in `self.error_counts`.
+        """
+        try:
+            return fn()
+        except Exception as e:
+            self.error_counts[op_name] += 1
+            logger.error("Redis %s failed for key %s: %s", op_name, key, e)
+            return default
+    
+    @staticmethod
+    def _deserialize(value: Optional[bytes]) -> Optional[Any]:
+        """Decode a stored value: MessagePack frame, raw bytes, then JSON, then plain text"""
+        if value is None:
+            return None
+        
+        tag = value[:1]
+        if tag == _MSGPACK_TAG:
+            return msgpack.unpackb(value[1:], raw=False, strict_map_key=False)
+        if tag == _BYTES_TAG:
+            return value[1:]
+        value = value.decode('utf-8')
+        
+        # Try to deserialize as JSON first, fallback to string
+        try:
+            return _json_loads(value)
+        except (json.JSONDecodeError, TypeError):
+            return value
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
         """Set a key-value pair with optional TTL"""
+        return self._call(
+            "set", key, False,
+            lambda: bool(self.redis_client.set(key, self._serialize(value), ex=ttl or None))
+        )
+    
+    def mset_with_ttl(self, items: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """Set many key-value pairs with an optional shared TTL.
+        
+        Redis has no MSET with expiry, so the SETs are pipelined instead: one round trip
+        per PIPELINE_BATCH_SIZE commands, which also bounds the server's reply buffer.
+        """
         try:
-            # Serialize value
-            if isinstance(value, (dict, list)):
-                serialized_value = json.dumps(value)
-            else:
-                serialized_value = str(value)
-            
-            if ttl:
-                self.redis_client.setex(key, ttl, serialized_value)
-            else:
-                self.redis_client.set(key, serialized_value)
-            return True
+            pipe = self.redis_client.pipeline(transaction=False)
+            results = []
+            queued = 0
+            for key, value in items.items():
+                pipe.set(key, self._serialize(value), ex=ttl or None)
+                queued += 1
+                if queued == PIPELINE_BATCH_SIZE:
+                    results.extend(pipe.execute())
+                    queued = 0
+            if queued:
+                results.extend(pipe.execute())
+            return all(results)
         except Exception as e:
-            logger.error(f"Failed to set Redis key {key}: {e}")
+            logger.error(f"Failed to set {len(items)} Redis keys: {e}")
             return False
     
     def get(self, key: str) -> Optional[Any]:
         """Get a value by key"""
-        try:
-            value = self.redis_client.get(key)
-            if value is None:
-                return None
-            
-            # Try to deserialize as JSON first, fallback to string
-            try:
-                return json.loads(value)
-            except (json.JSONDecodeError, TypeError):
-                return value
-                
-        except Exception as e:
-            logger.error(f"Failed to get Redis key {key}: {e}")
-            return None
+        return self._call("get", key, None, lambda: self._deserialize(self.redis_client.get(key)))
+    
+    def get_with_ttl(self, key: str) -> Tuple[Optional[Any], Optional[float]]:
+        """Get a value and its remaining TTL in seconds (None when the key never expires)
+        with one pipelined GET + PTTL round trip"""
+        def read():
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.pttl(key)
+            value, pttl = pipe.execute()
+            return self._deserialize(value), (pttl / 1000.0 if pttl >= 0 else None)
+        return self._call("get", key, (None, None), read)
     
     def delete(self, key: str) -> bool:
-        """Delete a key"""
+        """Delete a key (True once the command succeeded, whether or not the key existed)"""
+        return self._call("delete", key, False, lambda: self.redis_client.delete(key) is not None)
+    
+    def delete_many(self, keys: Iterable[str]) -> int:
+        """Delete keys in pipelined batches, one round trip per batch; returns the number deleted"""
+        deleted_count = 0
         try:
-            self.redis_client.delete(key)
-            return True
+            pipe = self.redis_client.pipeline(transaction=False)
+            queued = 0
+            for key in keys:
+                pipe.delete(key)
+                queued += 1
+                if queued == PIPELINE_BATCH_SIZE:
+                    deleted_count += sum(pipe.execute())
+                    queued = 0
+            if queued:
+                deleted_count += sum(pipe.execute())
         except Exception as e:
-            logger.error(f"Failed to delete Redis key {key}: {e}")
-            return False
+            logger.error(f"Failed to delete Redis keys: {e}")
+        return deleted_count
+    
+    def pipeline(self, transaction: bool = False):
+        """Return a pipeline on the underlying client for batching commands"""
+        return self.redis_client.pipeline(transaction=transaction)
     
     def exists(self, key: str) -> bool:
         """Check if key exists"""
-        try:
-            return bool(self.redis_client.exists(key))
-        except Exception as e:
-            logger.error(f"Failed to check Redis key existence {key}: {e}")
-            return False
+        return self._call("exists", key, False, lambda: bool(self.redis_client.exists(key)))
     
     def expire(self, key: str, ttl: int) -> bool:
         """Set expiration for a key"""
-        try:
-            return bool(self.redis_client.expire(key, ttl))
-        except Exception as e:
-            logger.error(f"Failed to set expiration for Redis key {key}: {e}")
-            return False
+        return self._call("expire", key, False, lambda: bool(self.redis_client.expire(key, ttl)))
     
     def incr(self, key: str, amount: int = 1) -> Optional[int]:
         """Increment a numeric value"""
-        try:
-            return self.redis_client.incrby(key, amount)
-        except Exception as e:
-            logger.error(f"Failed to increment Redis key {key}: {e}")
-            return None
+        return self._call("incr", key, None, lambda: self.redis_client.incrby(key, amount))
     
-    def get_keys(self, pattern: str = "*") -> List[str]:
-        """Get keys matching pattern"""
+    def iter_keys(self, pattern: str = "*") -> Iterator[str]:
+        """Iterate keys matching pattern with cursor-based SCAN, which never blocks the server
+        the way KEYS does; a key may be yielded more than once"""
         try:
-            return self.redis_client.keys(pattern)
+            for key in self.redis_client.scan_iter(match=pattern, count=SCAN_COUNT):
+                yield key.decode('utf-8')
         except Exception as e:
-            logger.error(f"Failed to get Redis keys with pattern {pattern}: {e}")
-            return []
+            logger.error(f"Failed to scan Redis keys with pattern {pattern}: {e}")
+    
+    def get_keys(self, pattern: str = "*") -> Iterator[str]:
+        """Get keys matching pattern, streamed from SCAN (may repeat a key).
+        
+        Feed it to delete_many() or consume it lazily; wrap in list() only when the full
+        key set is really needed.
+        """
+        yield from self.iter_keys(pattern)
+    
+    def count_keys(self, pattern: str = "*") -> int:
+        """Count distinct keys matching pattern (DBSIZE for the whole keyspace)"""
+        if pattern == "*":
+            return self._call("dbsize", pattern, 0, lambda: self.redis_client.dbsize())
+        # SCAN can repeat keys across cursor steps; only the keys are held, never a reply list
+        return len(set(self.iter_keys(pattern)))
     
-    def cleanup_expired(self):
-        """Redis handles expiration automatically, no manual cleanup needed"""
-        # Redis handles TTL expiration automatically
-        # This method is kept for compatibility but does nothing
-        pass
-
 
 class CacheManager:
     """High-level caching utilities built on RedisManager"""
     
     def __init__(self, redis_manager: RedisManager):
         self.redis = redis_manager
+        self._l1: "OrderedDict[str, tuple]" = OrderedDict()
+        self._l1_lock = threading.Lock()
+        # Strong references to in-flight write-behind tasks so they are not garbage collected
+        self._pending_writes: set = set()
+    
+    def _l1_store(self, cache_key: str, result: Any, ttl: float):
+        if CACHE_L1_TTL_SECONDS <= 0:
+            return
+        expires_at = time.monotonic() + min(ttl, CACHE_L1_TTL_SECONDS)
+        with self._l1_lock:
+            self._l1[cache_key] = (expires_at, result)
+            self._l1.move_to_end(cache_key)
+            while len(self._l1) > CACHE_L1_SIZE:
+                self._l1.popitem(last=False)
     
     def generate_cache_key(self, prefix: str, *args, **kwargs) -> str:
-        """Generate a cache key from prefix and arguments"""
-        key_parts = [prefix]
+        """Generate a cache key from prefix and arguments.
+        
+        Keys are always the prefix plus a fixed-length digest of the arguments, so they stay
+        small in Redis and on the wire; the readable prefix keeps pattern invalidation working.
+        """
+        # Unit separator between parts, so ("a_b",) and ("a", "b") cannot collide
+        key_bytes = bytearray(prefix.encode())
         
         # Add positional arguments
         for arg in args:
-            key_parts.append(str(arg))
+            key_bytes += b"\x1f"
+            key_bytes += str(arg).encode()
         
         # Add keyword arguments (sorted for consistency)
         for key, value in sorted(kwargs.items()):
-            key_parts.append(f"{key}:{value}")
-        
-        # Create hash for long keys
-        key_string = "_".join(key_parts)
-        if len(key_string) > 200:
-            key_hash = hashlib.md5(key_string.encode()).hexdigest()
-            return f"{prefix}_hash_{key_hash}"
+            key_bytes += b"\x1f"
+            key_bytes += f"{key}:{value}".encode()
         
-        return key_string
+        return f"{prefix}_{_key_digest(key_bytes)}"
     
     def cache_result(self, cache_key: str, result: Any, ttl: int = 3600) -> bool:
         """Cache a result with TTL"""
-        return self.redis.set(cache_key, result, ttl)
+        stored = self.redis.set(cache_key, result, ttl)
+        if stored:
+            self._l1_store(cache_key, copy.deepcopy(result), ttl)
+        return stored
     
     def get_cached_result(self, cache_key: str) -> Optional[Any]:
         """Get a cached result"""
-        return self.redis.get(cache_key)
+        with self._l1_lock:
+            entry = self._l1.get(cache_key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._l1.move_to_end(cache_key)
+                else:
+                    del self._l1[cache_key]
+                    entry = None
+        if entry is not None:
+            # Callers get their own copy, as they would from a Redis read
+            return copy.deepcopy(entry[1])
+        
+        if CACHE_L1_TTL_SECONDS <= 0:
+            return self.redis.get(cache_key)
+        
+        # Cap the L1 entry by the key's remaining Redis lifetime so it never outlives the key
+        result, remaining_ttl = self.redis.get_with_ttl(cache_key)
+        if result is not None:
+            ttl = CACHE_L1_TTL_SECONDS if remaining_ttl is None else remaining_ttl
+            self._l1_store(cache_key, copy.deepcopy(result), ttl)
+        return result
     
     def invalidate_cache(self, pattern: str) -> int:
         """Invalidate cache entries matching pattern"""
-        keys = self.redis.get_keys(pattern)
-        deleted_count = 0
-        
-        for key in keys:
-            if self.redis.delete(key):
-                deleted_count += 1
+        with self._l1_lock:
+            for key in [key for key in self._l1 if fnmatch.fnmatchcase(key, pattern)]:
+                del self._l1[key]
         
-        return deleted_count
+        # Stream scanned keys straight into the pipelined deletes
+        return self.redis.delete_many(self.redis.iter_keys(pattern))
     
     def cache_function_result(self, ttl: int = 3600, prefix: str = "func"):
-        """Decorator to cache function results"""
+        """Decorator to cache function results; coroutine functions get an async wrapper
+        that keeps the blocking Redis calls off the event loop"""
         def decorator(func):
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    cache_key = self.generate_cache_key(
+                        f"{prefix}_{func.__name__}", 
+                        *args, 
+                        **kwargs
+                    )
+                    
+                    cached_result = await asyncio.to_thread(self.get_cached_result, cache_key)
+                    if cached_result is not None:
+                        logger.debug(f"Cache hit for {func.__name__}: {cache_key}")
+                        return cached_result
+                    
+                    logger.debug(f"Cache miss for {func.__name__}: {cache_key}")
+                    result = await func(*args, **kwargs)
+                    
+                    # Write behind: the caller returns without waiting for the SET. The copy
+                    # keeps later mutations by the caller out of the cached value
+                    write = asyncio.create_task(
+                        asyncio.to_thread(self.cache_result, cache_key, copy.deepcopy(result), ttl)
+                    )
+                    self._pending_writes.add(write)
+                    write.add_done_callback(self._pending_writes.discard)
+                    
+                    return result
+                
+                return async_wrapper
+            
+            @functools.wraps(func)
             def wrapper(*args, **kwargs):
                 # Generate cache key
                 cache_key = self.generate_cache_key(
@@ -213,29 +479,36 @@ class CacheManager:
         return decorator
 
 
-# Global Redis manager instance
-redis_manager = RedisManager()
-cache_manager = CacheManager(redis_manager)
+# Global Redis manager instance, created on first use so importing this module
+# (migrations, CLI scripts) does not need a reachable Redis
+_redis_manager: Optional[RedisManager] = None
+_cache_manager: Optional[CacheManager] = None
+_init_lock = threading.Lock()
 
 # Convenience functions
 def get_redis() -> RedisManager:
     """Get the global Redis manager instance"""
-    return redis_manager
+    global _redis_manager
+    if _redis_manager is None:
+        with _init_lock:
+            if _redis_manager is None:
+                _redis_manager = RedisManager()
+    return _redis_manager
 
 def get_cache() -> CacheManager:
     """Get the global cache manager instance"""
-    return cache_manager
+    global _cache_manager
+    if _cache_manager is None:
+        redis = get_redis()
+        with _init_lock:
+            if _cache_manager is None:
+                _cache_manager = CacheManager(redis)
+    return _cache_manager
 
-# Background cleanup task
-async def redis_cleanup_task():
-    """Background task to clean up expired cache entries"""
-    while True:
-        try:
-            redis_manager.cleanup_expired()
-            await asyncio.sleep(300)  # Run every 5 minutes
-        except Exception as e:
-            logger.error(f"Error in Redis cleanup task: {e}")
-            await asyncio.sleep(300)
-
-# Import asyncio for the cleanup task
-import asyncio
+def __getattr__(name: str):
+    """Keep `from utilities.redis_manager import redis_manager, cache_manager` working"""
+    if name == "redis_manager":
+        return get_redis()
+    if name == "cache_manager":
+        return get_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,11 +1,52 @@
 """
 Secure logging utilities to prevent sensitive information exposure
 """
-import os
+import atexit
 import logging
-import re
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from typing import Any, Optional
 
+from utils.env import get_environment
+
+logger = logging.getLogger(__name__)
+
+# Level names accepted by secure_log, resolved once instead of per call
+_LEVELS = {
+    'DEBUG': logging.DEBUG,
+    'INFO': logging.INFO,
+    'WARNING': logging.WARNING,
+    'ERROR': logging.ERROR,
+}
+
+_queue_listener: Optional[QueueListener] = None
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """
+    Configure root logging to hand records to a background thread
+    
+    The root logger gets a QueueHandler, and a QueueListener thread does the
+    actual stream I/O, so request threads never block on stdout. Does nothing
+    if the root logger already has handlers (same rule as basicConfig).
+    
+    Args:
+        level: Root log level
+    """
+    global _queue_listener
+    root = logging.getLogger()
+    if _queue_listener is not None or root.handlers:
+        return
+    
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    log_queue = queue.SimpleQueue()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+    
+    _queue_listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _queue_listener.start()
+    atexit.register(_queue_listener.stop)
+
 def secure_log(level: str, message: str, sensitive_data: Optional[Any] = None, environment: Optional[str] = None) -> None:
     """
     Log messages securely, hiding sensitive information in production
@@ -14,67 +55,51 @@ def secure_log(level: str, message: str, sensitive_data: Optional[Any] = None, e
         level: Log level (DEBUG, INFO, WARNING, ERROR)
         message: Log message
         sensitive_data: Optional sensitive data to log (only in development)
-        environment: Environment override (defaults to ENVIRONMENT env var)
+        environment: Environment override (defaults to the detected environment)
     """
     if environment is None:
-        environment = os.getenv('ENVIRONMENT', 'development')
-    
-    # Get logger for this module
-    logger = logging.getLogger(__name__)
-    
-    # Map level string to logger method
-    level_methods = {
-        'DEBUG': logger.debug,
-        'INFO': logger.info,
-        'WARNING': logger.warning,
-        'ERROR': logger.error
-    }
+        environment = get_environment()
     
-    log_method = level_methods.get(level.upper(), logger.info)
+    log_level = _LEVELS.get(level.upper(), logging.INFO)
     
     # In production, never log sensitive data
     if environment == 'production':
         if sensitive_data is not None:
             # Replace all occurrences of sensitive data with placeholder
             sensitive_str = str(sensitive_data)
-            # Use regex to replace all occurrences, including partial matches
-            escaped_sensitive = re.escape(sensitive_str)
-            message = re.sub(escaped_sensitive, '[REDACTED]', message)
-        log_method(message)
+            # Literal substring replacement; same result as re.sub on the
+            # escaped string without building a pattern per call
+            if sensitive_str and sensitive_str in message:
+                message = message.replace(sensitive_str, '[REDACTED]')
+        logger.log(log_level, message)
     else:
         # In development, log everything
         if sensitive_data is not None:
-            log_method(f"{message}: {sensitive_data}")
+            logger.log(log_level, "%s: %s", message, sensitive_data)
         else:
-            log_method(message)
+            logger.log(log_level, message)
 
 def secure_print_api_key_status(key_name: str, key_value: Optional[str], environment: Optional[str] = None) -> None:
     """
-    Securely print API key status without exposing the actual key
+    Securely log API key status without exposing the actual key
     
     Args:
         key_name: Name of the API key
         key_value: The actual API key value
         environment: Environment override
     """
-    if environment is None:
-        environment = os.getenv('ENVIRONMENT', 'development')
-    
     if key_value:
-        print(f"✅ {key_name}: Set")
+        logger.info("✅ %s: Set", key_name)
     else:
-        print(f"❌ {key_name}: Missing")
+        logger.info("❌ %s: Missing", key_name)
 
 def secure_print_database_url(db_url: str, environment: Optional[str] = None) -> None:
     """
-    Securely print database URL without exposing credentials
+    Securely log database URL without exposing credentials
     
     Args:
         db_url: Database connection URL
         environment: Environment override
     """
-    if environment is None:
-        environment = os.getenv('ENVIRONMENT', 'development')
-    
     # Always show minimal information regardless of environment
-    print("✅ Database: Connected")
+    logger.info("✅ Database: Connected")
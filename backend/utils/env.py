@@ -2,12 +2,17 @@
 Environment detection utilities
 """
 import os
+from functools import lru_cache
 from typing import Optional
 
 
+@lru_cache(maxsize=1)
 def is_production() -> bool:
     """
     Check if the application is running in production environment.
+
+    The result is memoized: the environment does not change at runtime and
+    this sits on the logging path.
     
     Returns:
         bool: True if in production, False otherwise
@@ -34,6 +39,7 @@ def is_production() -> bool:
         return False
 
 
+@lru_cache(maxsize=1)
 def get_environment() -> str:
     """
     Get the current environment name.